@@ -1,49 +1,193 @@
 import os
+import io
+import re
+import json
+import fnmatch
+import shutil
+import socket
+import struct
+import tarfile
+import time
+import zipfile
+import hashlib
 import duckdb
-from pathlib import Path
+import pyarrow as pa
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PurePosixPath
 import argparse
-from tensorboard.backend.event_processing import event_accumulator
+from tensorboard.compat.proto import event_pb2, types_pb2
 import base64
 from tqdm import tqdm
+from brain_stats_repository import sql_string
 
 
 # Set paths
 RUNS_DIR = Path(__file__).parent.parent / 'pgc' / 'runs'
 DUCKDB_FILE = Path(__file__).parent / 'brain_stats.duckdb'
+PARQUET_DIR = Path(__file__).parent / 'brain_stats_parquet'
+SHARD_DIR = Path(__file__).parent / 'brain_stats_shards'
+FILTERS_FILE = Path(__file__).parent / 'brain_stats_import_filters.json'
+LOGS_DIR = Path(__file__).parent / 'research_records'
+LOG_EXTRACTORS_FILE = Path(__file__).parent / 'brain_stats_log_extractors.json'
 
-# Connect to DuckDB and create tables
-con = duckdb.connect(str(DUCKDB_FILE))
-con.execute('''
-CREATE TABLE IF NOT EXISTS scalars (
-    study TEXT,
-    tag TEXT,
-    step INTEGER,
-    wall_time DOUBLE,
-    value DOUBLE,
-    machine TEXT
-)
-''')
-con.execute('''
-CREATE TABLE IF NOT EXISTS images (
-    study TEXT,
-    tag TEXT,
-    step INTEGER,
-    wall_time DOUBLE,
-    image_format TEXT,
-    image_data BLOB,
-    machine TEXT
-)
-''')
-
-def setup_database(mode='append'):
+# Tables are created by setup_database, importing this module must not open the
+# main database: shard workers on other hosts never touch it
+
+def connect_db(db_file=DUCKDB_FILE, retries=50, delay=0.2):
+    """Open the database for writing, waiting while a live viewer briefly holds it"""
+    for attempt in range(retries):
+        try:
+            return duckdb.connect(str(db_file))
+        except duckdb.IOException:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay)
+
+# Column layout of the bulk insert batches, in table order
+SCALAR_SCHEMA = pa.schema([
+    ('study', pa.string()),
+    ('tag', pa.string()),
+    ('step', pa.int64()),
+    ('wall_time', pa.float64()),
+    ('value', pa.float64()),
+    ('machine', pa.string()),
+])
+IMAGE_SCHEMA = pa.schema([
+    ('study', pa.string()),
+    ('tag', pa.string()),
+    ('step', pa.int64()),
+    ('wall_time', pa.float64()),
+    ('image_format', pa.string()),
+    ('image_data', pa.binary()),
+    ('machine', pa.string()),
+])
+# Histograms keep TensorBoard's layout: right edges of the buckets and their
+# counts, one list each per step
+HISTOGRAM_SCHEMA = pa.schema([
+    ('study', pa.string()),
+    ('tag', pa.string()),
+    ('step', pa.int64()),
+    ('wall_time', pa.float64()),
+    ('min_value', pa.float64()),
+    ('max_value', pa.float64()),
+    ('num', pa.float64()),
+    ('bucket_limit', pa.list_(pa.float64())),
+    ('bucket', pa.list_(pa.float64())),
+    ('machine', pa.string()),
+])
+
+# Per-series summary of a set of scalar rows; m2 is the sum of squared
+# deviations from the mean, kept so batches can be merged exactly
+SERIES_STATS_SELECT = """
+    SELECT study, tag, machine,
+           count(*) AS count,
+           min(value) AS min_value,
+           max(value) AS max_value,
+           arg_min(step, value) AS argmin_step,
+           arg_max(step, value) AS argmax_step,
+           min(step) AS first_step,
+           arg_min(value, step) AS first_value,
+           max(step) AS last_step,
+           arg_max(value, step) AS last_value,
+           avg(value) AS mean,
+           coalesce(var_pop(value), 0) * count(*) AS m2,
+           coalesce(var_pop(value), 0) AS variance
+    FROM {source}
+    GROUP BY study, tag, machine
+"""
+
+# Fold a batch summary into the stored one (Chan et al. parallel form of
+# Welford's update). Unqualified names refer to the stored row.
+SERIES_STATS_MERGE = """
+    INSERT INTO series_stats
+    {select}
+    ON CONFLICT (study, tag, machine) DO UPDATE SET
+        count = count + excluded.count,
+        min_value = least(min_value, excluded.min_value),
+        max_value = greatest(max_value, excluded.max_value),
+        argmin_step = CASE WHEN excluded.min_value < min_value THEN excluded.argmin_step ELSE argmin_step END,
+        argmax_step = CASE WHEN excluded.max_value > max_value THEN excluded.argmax_step ELSE argmax_step END,
+        first_step = least(first_step, excluded.first_step),
+        first_value = CASE WHEN excluded.first_step < first_step THEN excluded.first_value ELSE first_value END,
+        last_step = greatest(last_step, excluded.last_step),
+        last_value = CASE WHEN excluded.last_step >= last_step THEN excluded.last_value ELSE last_value END,
+        mean = mean + (excluded.mean - mean) * excluded.count / (count + excluded.count),
+        m2 = m2 + excluded.m2 + (excluded.mean - mean) ^ 2 * count * excluded.count / (count + excluded.count),
+        variance = (m2 + excluded.m2 + (excluded.mean - mean) ^ 2 * count * excluded.count / (count + excluded.count))
+                   / (count + excluded.count)
+"""
+
+def insert_batch(con, table, batch):
+    """Bulk insert an Arrow table whose columns match the target table"""
+    if batch.num_rows == 0:
+        return
+    con.register('batch', batch)
+    try:
+        con.execute(f"INSERT INTO {table} ({', '.join(batch.column_names)}) SELECT * FROM batch")
+        if table == 'scalars':
+            con.execute(SERIES_STATS_MERGE.format(select=SERIES_STATS_SELECT.format(source='batch')))
+    finally:
+        con.unregister('batch')
+
+# Parquet output: <PARQUET_DIR>/<table>/study=<study>/machine=<machine>/<event file>.parquet.
+# study and machine live in the path only, rows are sorted so that each row
+# group covers few tags and a narrow step range, and row groups are kept small
+# enough for DuckDB to skip the ones a tag filter rules out
+PARQUET_SORT = {'scalars': 'tag, step', 'images': 'tag, step', 'histograms': 'tag, step', 'series_stats': 'tag'}
+PARQUET_ROW_GROUP_ROWS = {'scalars': 100_000, 'images': 256, 'histograms': 10_000, 'series_stats': 100_000}
+
+def partition_dir(dataset, table, study, machine):
+    return Path(dataset) / table / f'study={study}' / f'machine={machine}'
+
+def write_parquet(con, path, table, relation):
+    """Write relation (a registered name or a subquery) to path, replacing it only once complete"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    con.execute(f"""
+        COPY (SELECT * EXCLUDE (study, machine) FROM {relation} ORDER BY {PARQUET_SORT[table]})
+        TO {sql_string(str(tmp))} (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {PARQUET_ROW_GROUP_ROWS[table]})
+    """)
+    os.replace(tmp, path)
+
+def write_parquet_batches(dataset, event_file, study, machine, batches):
+    """Write one event file's batches into its study/machine partitions.
+
+    Each event file gets a file of its own named after it, so importing it
+    again replaces that file and leaves every other partition untouched.
+    The partition's series_stats are then rebuilt from all of its scalars.
+    """
+    con = duckdb.connect()
+    try:
+        for table, batch in batches.items():
+            if batch.num_rows == 0:
+                continue
+            con.register('batch', batch)
+            try:
+                write_parquet(con, partition_dir(dataset, table, study, machine) / f'{event_file.name}.parquet',
+                              table, 'batch')
+            finally:
+                con.unregister('batch')
+        if batches['scalars'].num_rows:
+            files = partition_dir(dataset, 'scalars', study, machine) / '*.parquet'
+            source = f"read_parquet({sql_string(str(files))}, hive_partitioning=true, hive_types_autocast=false)"
+            write_parquet(con, partition_dir(dataset, 'series_stats', study, machine) / 'series_stats.parquet',
+                          'series_stats', f"({SERIES_STATS_SELECT.format(source=source)})")
+    finally:
+        con.close()
+
+def setup_database(mode='append', db_file=DUCKDB_FILE):
     """Set up the database based on the specified mode"""
-    con = duckdb.connect(DUCKDB_FILE)
+    con = connect_db(db_file)
     
     if mode == 'reset':
         # Drop tables if they exist
         con.execute("DROP TABLE IF EXISTS scalars")
         con.execute("DROP TABLE IF EXISTS images")
-        print(f"Reset: Dropped existing tables in {DUCKDB_FILE}")
+        con.execute("DROP TABLE IF EXISTS histograms")
+        con.execute("DROP TABLE IF EXISTS series_stats")
+        con.execute("DROP TABLE IF EXISTS log_offsets")
+        print(f"Reset: Dropped existing tables in {db_file}")
     
     # Create tables if they don't exist
     con.execute("""
@@ -69,8 +213,121 @@ def setup_database(mode='append'):
     )
     """)
     
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS histograms (
+        study VARCHAR,
+        tag VARCHAR,
+        step BIGINT,
+        wall_time DOUBLE,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        num DOUBLE,
+        bucket_limit DOUBLE[],
+        bucket DOUBLE[],
+        machine VARCHAR
+    )
+    """)
+    
+    # How far each text log has been imported, see import_log
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS log_offsets (
+        path VARCHAR PRIMARY KEY,
+        byte_offset BIGINT
+    )
+    """)
+    
+    has_stats = con.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'series_stats'"
+    ).fetchone()[0]
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS series_stats (
+        study VARCHAR,
+        tag VARCHAR,
+        machine VARCHAR,
+        count BIGINT,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        argmin_step BIGINT,
+        argmax_step BIGINT,
+        first_step BIGINT,
+        first_value DOUBLE,
+        last_step BIGINT,
+        last_value DOUBLE,
+        mean DOUBLE,
+        m2 DOUBLE,
+        variance DOUBLE,
+        PRIMARY KEY (study, tag, machine)
+    )
+    """)
+    if not has_stats:
+        # Older databases: summarise what is already there once, batches keep it current from now on
+        con.execute("INSERT INTO series_stats " + SERIES_STATS_SELECT.format(source='scalars'))
+    
     con.close()
 
+# Merged tables are written in this order, whichever shard a row came from
+MERGE_ORDER = {
+    'scalars': 'study, tag, machine, step, wall_time, value',
+    'images': 'study, tag, machine, step, wall_time, image_format',
+    'histograms': 'study, tag, machine, step, wall_time',
+}
+
+def parse_shard(text):
+    """'i/N' -> (i, N) with 0 <= i < N"""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}, got {index}")
+    return index, count
+
+def shard_of(study, machine, count):
+    """Shard a (study, machine) belongs to, the same on every host and Python version.
+
+    Whole study/machine pairs go to one shard, so each shard's Parquet
+    partitions and series_stats are complete on their own.
+    """
+    digest = hashlib.sha1(f"{study}/{machine}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+def shard_file(shard_dir, index, count):
+    return Path(shard_dir) / f'shard-{index}-of-{count}.duckdb'
+
+def merge_shards(shard_files, mode='append', db_file=DUCKDB_FILE):
+    """Combine shard databases into db_file.
+
+    Exact duplicate rows (a file imported by two shards, a shard merged
+    twice) are dropped and the tables are rewritten sorted by MERGE_ORDER,
+    so the result does not depend on how files were spread over shards or
+    the order the shards are given in. series_stats is rebuilt from the
+    merged scalars.
+    """
+    setup_database(mode, db_file)
+    con = connect_db(db_file)
+    try:
+        for i, shard in enumerate(shard_files):
+            con.execute(f"ATTACH {sql_string(str(shard))} AS shard{i} (READ_ONLY)")
+        con.begin()
+        for table, schema in (('scalars', SCALAR_SCHEMA), ('images', IMAGE_SCHEMA), ('histograms', HISTOGRAM_SCHEMA)):
+            columns = ', '.join(schema.names)
+            # Shards from before histograms were imported have no such table
+            present = {row[0] for row in con.execute(
+                "SELECT database_name FROM duckdb_tables() WHERE table_name = ?", [table]).fetchall()}
+            sources = [table] + [f"shard{i}.{table}" for i in range(len(shard_files)) if f"shard{i}" in present]
+            union = ' UNION '.join(f"SELECT {columns} FROM {source}" for source in sources)
+            con.execute(f"CREATE TEMP TABLE merged AS SELECT * FROM ({union}) ORDER BY {MERGE_ORDER[table]}")
+            con.execute(f"DELETE FROM {table}")
+            con.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM merged")
+            con.execute("DROP TABLE merged")
+        con.execute("DELETE FROM series_stats")
+        con.execute("INSERT INTO series_stats " + SERIES_STATS_SELECT.format(source='scalars'))
+        con.commit()
+        # Give the space of the replaced rows back
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+
 def extract_machine_name(event_file):
     """Extract machine name from event file path"""
     # Example: events.out.tfevents.1747303702.zen.5470.0
@@ -83,72 +340,538 @@ def extract_machine_name(event_file):
         pass
     return 'unknown'  # Default if we can't extract the machine name
 
-def process_event_file(event_file, study_name):
-    ea = event_accumulator.EventAccumulator(
-        str(event_file),
-        size_guidance={
-            event_accumulator.SCALARS: 0,  # 0 means load all
-            event_accumulator.IMAGES: 0,
-        }
-    )
+def detect_image_format(img_data):
+    """Image format as PIL names it, 'unknown' if PIL cannot tell"""
     try:
-        ea.Reload()
-    except Exception as e:
-        print(f"Could not load {event_file}: {e}")
+        from PIL import Image
+        img = Image.open(io.BytesIO(img_data))
+        return img.format or "unknown"
+    except Exception:
+        return "unknown"
+
+def write_batches(batches, event_file, study_name, machine_name, output='duckdb', parquet_dir=PARQUET_DIR,
+                  db_file=DUCKDB_FILE, log_offset=None):
+    """Store one event file's batches in the selected outputs.
+
+    log_offset, a (log path, byte offset) pair, records how far a text log
+    has been imported, in the same transaction as the rows read from it.
+    """
+    if output in ('parquet', 'both'):
+        write_parquet_batches(parquet_dir, event_file, study_name, machine_name, batches)
+        if log_offset:
+            save_parquet_log_offset(parquet_dir, *log_offset)
+    if output == 'parquet':
         return
-    
+    con = connect_db(db_file)
+    try:
+        con.begin()
+        insert_batch(con, 'scalars', batches['scalars'])
+        insert_batch(con, 'images', batches['images'])
+        insert_batch(con, 'histograms', batches['histograms'])
+        if log_offset:
+            con.execute("INSERT OR REPLACE INTO log_offsets VALUES (?, ?)", list(log_offset))
+        con.commit()
+    finally:
+        # Release the write lock between files so a live viewer can poll
+        con.close()
+
+# Tag filters, per study pattern, from a JSON list of rules such as
+#   [{"studies": "674gs_*", "include": ["Batch/*", "Brain/*"], "exclude": ["re:Brain/Layer\\d+/.*"]}]
+# Tag patterns are globs, or regexes behind "re:". A tag is kept if every rule
+# whose studies pattern matches the study keeps it: it matches one of the
+# rule's includes (when the rule has any) and none of its excludes
+def compile_tag_pattern(pattern):
+    if pattern.startswith('re:'):
+        return re.compile(pattern[3:])
+    return re.compile(fnmatch.translate(pattern))
+
+def load_tag_filters(path):
+    """[(study glob, include patterns or None, exclude patterns)] from the filter file, [] without one"""
+    if not path or not Path(path).exists():
+        return []
+    with open(path, 'r') as f:
+        rules = json.load(f)
+    return [(rule.get('studies', '*'),
+             [compile_tag_pattern(p) for p in rule['include']] if 'include' in rule else None,
+             [compile_tag_pattern(p) for p in rule.get('exclude', [])])
+            for rule in rules]
+
+def tag_filter_for(filter_rules, study_name):
+    """Predicate over the tags of one study, None when no rule applies to it"""
+    active = [(include, exclude) for studies, include, exclude in filter_rules
+              if fnmatch.fnmatchcase(study_name, studies)]
+    if not active:
+        return None
+    # A file repeats the same few tags at every step, decide each one once
+    decided = {}
+
+    def keep_tag(tag):
+        keep = decided.get(tag)
+        if keep is None:
+            keep = decided[tag] = all(
+                (include is None or any(p.fullmatch(tag) for p in include))
+                and not any(p.fullmatch(tag) for p in exclude)
+                for include, exclude in active)
+        return keep
+    return keep_tag
+
+# Event files are TFRecord streams of Event protos, read in large blocks
+READ_BUFFER = 1 << 20
+
+def read_event_records(stream):
+    """Yield the serialized Event records of a TFRecord stream, stopping at a truncated tail.
+
+    Each record is a uint64 length, its masked CRC, the data and the data's
+    masked CRC. The CRCs are not checked.
+    """
+    while True:
+        header = stream.read(12)
+        if len(header) < 12:
+            return
+        length, = struct.unpack('<Q', header[:8])
+        data = stream.read(length)
+        if len(data) < length or len(stream.read(4)) < 4:
+            return
+        yield data
+
+# Tensor summaries (TF2 tf.summary, newer PyTorch writers) name the plugin that
+# owns them in their metadata, which writers only send with the first value of
+# each tag in a file. Scalars are 0-d numeric tensors, images a string tensor
+# of [width, height, encoded image, ...]
+SCALAR_PLUGIN = 'scalars'
+IMAGE_PLUGIN = 'images'
+HISTOGRAM_PLUGIN = 'histograms'  # a [k, 3] tensor of (left edge, right edge, count) rows
+# dtype -> struct format and the repeated field holding values when there is no tensor_content
+TENSOR_SCALAR_FORMATS = {
+    types_pb2.DT_FLOAT: ('<f', 'float_val'),
+    types_pb2.DT_DOUBLE: ('<d', 'double_val'),
+    types_pb2.DT_INT32: ('<i', 'int_val'),
+    types_pb2.DT_INT64: ('<q', 'int64_val'),
+    types_pb2.DT_HALF: ('<e', 'half_val'),
+    types_pb2.DT_BFLOAT16: (None, 'half_val'),
+}
+
+def tensor_scalar(tensor):
+    """The number in a scalar TensorProto, None if it holds no number"""
+    if tensor.dtype not in TENSOR_SCALAR_FORMATS:
+        return None
+    fmt, field = TENSOR_SCALAR_FORMATS[tensor.dtype]
+    if tensor.tensor_content:
+        if fmt is None:
+            # bfloat16 is the top half of a float32
+            return struct.unpack('<f', b'\0\0' + tensor.tensor_content[:2])[0]
+        return float(struct.unpack_from(fmt, tensor.tensor_content)[0])
+    values = getattr(tensor, field)
+    if not values:
+        return None
+    if tensor.dtype == types_pb2.DT_HALF:
+        return struct.unpack('<e', struct.pack('<H', values[0]))[0]
+    if tensor.dtype == types_pb2.DT_BFLOAT16:
+        return struct.unpack('<f', struct.pack('<I', values[0] << 16))[0]
+    return float(values[0])
+
+def tensor_numbers(tensor):
+    """Every value of a float or double TensorProto, flattened"""
+    if tensor.dtype not in (types_pb2.DT_FLOAT, types_pb2.DT_DOUBLE):
+        return []
+    fmt, field = TENSOR_SCALAR_FORMATS[tensor.dtype]
+    if tensor.tensor_content:
+        count = len(tensor.tensor_content) // struct.calcsize(fmt)
+        return list(struct.unpack(f'<{count}{fmt[1]}', tensor.tensor_content))
+    return list(getattr(tensor, field))
+
+def collect_event_batches(stream, study_name, machine_name, filter_rules=()):
+    """Scalar, image and histogram batches of one event file read from stream.
+
+    Values whose tag the filter rules drop are skipped before their image
+    is inspected or anything is copied into a batch. Every other record is
+    kept; EventAccumulator also dropped the steps of a restarted session,
+    but a restart starts a new event file.
+    """
+    keep_tag = tag_filter_for(filter_rules, study_name)
+    scalars = {name: [] for name in SCALAR_SCHEMA.names}
+    images = {name: [] for name in IMAGE_SCHEMA.names}
+
+    def add_scalar(tag, event, number):
+        scalars['study'].append(study_name)
+        scalars['tag'].append(tag)
+        scalars['step'].append(event.step)
+        scalars['wall_time'].append(event.wall_time)
+        scalars['value'].append(number)
+        scalars['machine'].append(machine_name)
+
+    def add_image(tag, event, img_data):
+        images['study'].append(study_name)
+        images['tag'].append(tag)
+        images['step'].append(event.step)
+        images['wall_time'].append(event.wall_time)
+        images['image_format'].append(detect_image_format(img_data))
+        images['image_data'].append(img_data)
+        images['machine'].append(machine_name)
+
+    histograms = {name: [] for name in HISTOGRAM_SCHEMA.names}
+
+    def add_histogram(tag, event, min_value, max_value, bucket_limit, bucket):
+        histograms['study'].append(study_name)
+        histograms['tag'].append(tag)
+        histograms['step'].append(event.step)
+        histograms['wall_time'].append(event.wall_time)
+        histograms['min_value'].append(min_value)
+        histograms['max_value'].append(max_value)
+        histograms['num'].append(sum(bucket))
+        histograms['bucket_limit'].append(bucket_limit)
+        histograms['bucket'].append(bucket)
+        histograms['machine'].append(machine_name)
+
+    plugins = {}  # tag -> plugin name of its tensor summaries
+    for record in read_event_records(stream):
+        event = event_pb2.Event.FromString(record)
+        if not event.HasField('summary'):
+            continue
+        for value in event.summary.value:
+            if keep_tag is not None and not keep_tag(value.tag):
+                continue
+            kind = value.WhichOneof('value')
+            if kind == 'simple_value':
+                add_scalar(value.tag, event, value.simple_value)
+            elif kind == 'image':
+                add_image(value.tag, event, value.image.encoded_image_string)
+            elif kind == 'histo':
+                histo = value.histo
+                add_histogram(value.tag, event, histo.min, histo.max, list(histo.bucket_limit), list(histo.bucket))
+            elif kind == 'tensor':
+                if value.metadata.plugin_data.plugin_name:
+                    plugins[value.tag] = value.metadata.plugin_data.plugin_name
+                plugin = plugins.get(value.tag)
+                if plugin == SCALAR_PLUGIN:
+                    number = tensor_scalar(value.tensor)
+                    if number is not None:
+                        add_scalar(value.tag, event, number)
+                elif plugin == IMAGE_PLUGIN:
+                    # More than one image per step (max_outputs > 1): the rest go to tag/1, tag/2, ...
+                    for i, img_data in enumerate(value.tensor.string_val[2:]):
+                        add_image(value.tag if i == 0 else f"{value.tag}/{i}", event, img_data)
+                elif plugin == HISTOGRAM_PLUGIN:
+                    numbers = tensor_numbers(value.tensor)
+                    if numbers:
+                        lefts, rights, counts = numbers[0::3], numbers[1::3], numbers[2::3]
+                        add_histogram(value.tag, event, lefts[0], rights[-1], rights, counts)
+    return {
+        'scalars': pa.Table.from_pydict(scalars, schema=SCALAR_SCHEMA),
+        'images': pa.Table.from_pydict(images, schema=IMAGE_SCHEMA),
+        'histograms': pa.Table.from_pydict(histograms, schema=HISTOGRAM_SCHEMA),
+    }
+
+def process_event_file(event_file, study_name, output='duckdb', parquet_dir=PARQUET_DIR, db_file=DUCKDB_FILE,
+                       filter_rules=()):
     # Extract machine name from event file path
     machine_name = extract_machine_name(event_file)
-    
-    con = duckdb.connect(DUCKDB_FILE)
-    
-    # Scalars
-    for tag in ea.Tags().get('scalars', []):
-        for scalar_event in ea.Scalars(tag):
-            con.execute(
-                "INSERT INTO scalars VALUES (?, ?, ?, ?, ?, ?)",
-                [study_name, tag, scalar_event.step, scalar_event.wall_time, scalar_event.value, machine_name]
-            )
-    # Images
-    for tag in ea.Tags().get('images', []):
-        for img_event in ea.Images(tag):
-            # Detect image format using PIL
+    try:
+        with open(event_file, 'rb', buffering=READ_BUFFER) as stream:
+            batches = collect_event_batches(stream, study_name, machine_name, filter_rules)
+    except Exception as e:
+        print(f"Could not load {event_file}: {e}")
+        return
+    write_batches(batches, event_file, study_name, machine_name, output, parquet_dir, db_file)
+
+# Archives of run folders are read member by member straight from the archive,
+# nothing is extracted to disk. Zip members can be opened independently and
+# are parsed by a process pool, tar streams (tar.gz, ...) only in order
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+def archive_event_member(name):
+    """(study, machine) for an archive member that is an event file, else None.
+
+    Members follow the runs layout, .../<study>/events.out.tfevents.*
+    """
+    path = PurePosixPath(name)
+    if not path.name.startswith('events.out.tfevents.') or len(path.parts) < 2:
+        return None
+    return path.parent.name, extract_machine_name(path)
+
+def read_zip_member(archive, name, study_name, machine_name, filter_rules):
+    """Worker process: parse one zip member into batches"""
+    with zipfile.ZipFile(archive) as zf, zf.open(name) as member:
+        return collect_event_batches(io.BufferedReader(member, READ_BUFFER), study_name, machine_name, filter_rules)
+
+def import_zip(archive, keep, store, workers, filter_rules=()):
+    """Parse the zip's event files in parallel, storing them in member order as they finish"""
+    with zipfile.ZipFile(archive) as zf:
+        members = [(info.filename, *archive_event_member(info.filename)) for info in zf.infolist()
+                   if not info.is_dir() and archive_event_member(info.filename)]
+    members = [member for member in members if keep(member[1], member[2])]
+    def store_next():
+        name, study_name, machine_name, future = pending.popleft()
+        try:
+            store(name, study_name, machine_name, future.result())
+        except Exception as e:
+            print(f"Could not load {archive}:{name}: {e}")
+        progress.update()
+
+    # At most two files per worker parsed ahead of the writer
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            tqdm(total=len(members), desc=f"Importing {Path(archive).name}") as progress:
+        for name, study_name, machine_name in members:
+            pending.append((name, study_name, machine_name,
+                            pool.submit(read_zip_member, archive, name, study_name, machine_name, filter_rules)))
+            if len(pending) >= 2 * workers:
+                store_next()
+        while pending:
+            store_next()
+
+def import_tar(archive, keep, store, filter_rules=()):
+    """Stream the tar's event files one after the other, compressed tars cannot seek"""
+    with tarfile.open(archive, mode='r|*') as tf, tqdm(desc=f"Importing {Path(archive).name}") as progress:
+        for info in tf:
+            member = archive_event_member(info.name) if info.isfile() else None
+            if member is None or not keep(*member):
+                continue
+            stream = io.BufferedReader(tf.extractfile(info), READ_BUFFER)
+            try:
+                store(info.name, *member, collect_event_batches(stream, *member, filter_rules))
+            except Exception as e:
+                print(f"Could not load {archive}:{info.name}: {e}")
+            progress.update()
+
+def import_archive(archive, keep, output='duckdb', parquet_dir=PARQUET_DIR, db_file=DUCKDB_FILE, workers=None,
+                   filter_rules=()):
+    """Import every event file in a zip or tar archive whose (study, machine) passes keep"""
+    def store(name, study_name, machine_name, batches):
+        write_batches(batches, PurePosixPath(name), study_name, machine_name, output, parquet_dir, db_file)
+
+    if zipfile.is_zipfile(archive):
+        import_zip(archive, keep, store, workers or os.cpu_count(), filter_rules)
+    else:
+        import_tar(archive, keep, store, filter_rules)
+
+# Plain-text research logs (research_records/log-*.txt) are read line by line and
+# parsed with regex extractors, from a JSON list such as
+#   [{"pattern": "step=(\\d+) acc=([\\d.]+)", "tags": ["Log/Accuracy"]},
+#    {"files": "log-2025-05-*", "pattern": "step=(?P<step>\\d+) .*loss=(?P<loss>[-+.\\deE]+)"}]
+# Group 1 is the step and the groups after it the values of "tags", in order.
+# With named groups "step" is the step, "wall_time" (optional) the time in
+# seconds since the epoch and every other group a value tagged with its name.
+# "files" limits an extractor to the logs whose file name matches it. Each log
+# is a study named after its file. The byte offset up to which a log has been
+# read is kept with the rows, so a later run only parses what was appended
+DEFAULT_LOG_EXTRACTORS = [{'pattern': r'step=(\d+) acc=([\d.]+)', 'tags': ['acc']}]
+LOG_OFFSETS_FILE = 'log_offsets.json'  # in the Parquet dataset root, for --output parquet
+
+def load_log_extractors(path):
+    """[(file glob, pattern, step group, wall_time group or None, [(tag, group)])] from the extractor file"""
+    rules = DEFAULT_LOG_EXTRACTORS
+    if path and Path(path).exists():
+        with open(path, 'r') as f:
+            rules = json.load(f)
+    extractors = []
+    for rule in rules:
+        pattern = re.compile(rule['pattern'])
+        if pattern.groupindex:
+            if 'step' not in pattern.groupindex:
+                raise ValueError(f"Log extractor {rule['pattern']!r} has no (?P<step>...) group")
+            fields = [(name, index) for name, index in pattern.groupindex.items() if name not in ('step', 'wall_time')]
+            extractors.append((rule.get('files', '*'), pattern, pattern.groupindex['step'],
+                               pattern.groupindex.get('wall_time'), fields))
+        else:
+            tags = rule.get('tags', [])
+            if len(tags) != pattern.groups - 1:
+                raise ValueError(f"Log extractor {rule['pattern']!r} has {pattern.groups} groups, "
+                                 f"expected the step and one per tag of {tags}")
+            extractors.append((rule.get('files', '*'), pattern, 1, None,
+                               [(tag, index) for index, tag in enumerate(tags, start=2)]))
+    return extractors
+
+def collect_log_scalars(stream, study_name, machine_name, extractors, filter_rules=()):
+    """Scalars parsed from the complete lines of a text log, and the number of bytes they took up.
+
+    A last line without its newline is still being written and is left for
+    the next run. Tags the filter rules drop are never extracted.
+    """
+    keep_tag = tag_filter_for(filter_rules, study_name)
+    active = []
+    for _, pattern, step_group, time_group, fields in extractors:
+        fields = [(tag, group) for tag, group in fields if keep_tag is None or keep_tag(tag)]
+        if fields:
+            active.append((pattern, step_group, time_group, fields))
+
+    scalars = {name: [] for name in SCALAR_SCHEMA.names}
+    consumed = 0
+    for raw in stream:
+        if not raw.endswith(b'\n'):
+            break
+        consumed += len(raw)
+        line = raw.decode('utf-8', errors='replace')
+        for pattern, step_group, time_group, fields in active:
+            match = pattern.search(line)
+            if match is None:
+                continue
             try:
-                from PIL import Image
-                import io
-                img = Image.open(io.BytesIO(img_event.encoded_image_string))
-                img_format = img.format or "unknown"
-            except Exception:
-                img_format = "unknown"
-            con.execute(
-                "INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
-                [study_name, tag, img_event.step, img_event.wall_time, img_format, img_event.encoded_image_string, machine_name]
-            )
+                step = int(match.group(step_group))
+                wall_time = float(match.group(time_group)) if time_group else None
+            except (TypeError, ValueError):
+                continue
+            for tag, group in fields:
+                try:
+                    value = float(match.group(group))
+                except (TypeError, ValueError):
+                    continue
+                scalars['study'].append(study_name)
+                scalars['tag'].append(tag)
+                scalars['step'].append(step)
+                scalars['wall_time'].append(wall_time)
+                scalars['value'].append(value)
+                scalars['machine'].append(machine_name)
+    return pa.Table.from_pydict(scalars, schema=SCALAR_SCHEMA), consumed
+
+def load_log_offsets(output='duckdb', parquet_dir=PARQUET_DIR, db_file=DUCKDB_FILE):
+    """{log path: byte offset} of the logs imported into the output so far"""
+    if output == 'parquet':
+        path = Path(parquet_dir) / LOG_OFFSETS_FILE
+        if not path.exists():
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+    con = connect_db(db_file)
+    try:
+        return dict(con.execute("SELECT path, byte_offset FROM log_offsets").fetchall())
+    finally:
+        con.close()
+
+def save_parquet_log_offset(parquet_dir, log_path, byte_offset):
+    path = Path(parquet_dir) / LOG_OFFSETS_FILE
+    offsets = {}
+    if path.exists():
+        with open(path, 'r') as f:
+            offsets = json.load(f)
+    offsets[log_path] = byte_offset
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(offsets, f, indent=1)
+    os.replace(tmp, path)
+
+def log_files(paths):
+    """The log files behind paths, a folder stands for its log-*.txt"""
+    files = []
+    for path in paths:
+        files.extend(sorted(path.glob('log-*.txt')) if path.is_dir() else [path])
+    return files
+
+def import_log(log_file, machine_name, extractors, offsets, output='duckdb', parquet_dir=PARQUET_DIR,
+               db_file=DUCKDB_FILE, filter_rules=()):
+    """Import the lines appended to log_file since its offset in offsets, returns the rows added"""
+    key = str(log_file.resolve())
+    start = offsets.get(key, 0)
+    if log_file.stat().st_size < start:
+        print(f"{log_file} is shorter than when it was last imported, reading it from the start")
+        start = 0
+    with open(log_file, 'rb', buffering=READ_BUFFER) as stream:
+        stream.seek(start)
+        scalars, consumed = collect_log_scalars(stream, log_file.stem, machine_name,
+                                                [e for e in extractors if fnmatch.fnmatchcase(log_file.name, e[0])],
+                                                filter_rules)
+    if consumed == 0:
+        return 0
+    batches = {'scalars': scalars, 'images': IMAGE_SCHEMA.empty_table(), 'histograms': HISTOGRAM_SCHEMA.empty_table()}
+    # Every increment is a Parquet file of its own, named after where it starts in the log
+    write_batches(batches, PurePosixPath(f"{log_file.name}.{start}"), log_file.stem, machine_name, output,
+                  parquet_dir, db_file, log_offset=(key, start + consumed))
+    offsets[key] = start + consumed
+    return scalars.num_rows
 
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Import TensorBoard event files to DuckDB')
     parser.add_argument('--mode', choices=['reset', 'append'], required=True,
                        help='Mode: reset (drop all tables) or append (add to existing data)')
+    parser.add_argument('--output', choices=['duckdb', 'parquet', 'both'], default='duckdb',
+                        help='Write to the DuckDB file, a partitioned Parquet dataset, or both (default: duckdb)')
+    parser.add_argument('--parquet-dir', type=Path, default=PARQUET_DIR,
+                        help='Root of the Parquet dataset (default: brain_stats_parquet next to this script)')
+    parser.add_argument('--runs-dir', type=Path, default=RUNS_DIR, help='Folder holding one subfolder per study')
+    parser.add_argument('--db', type=Path, default=DUCKDB_FILE,
+                        help='Main database, imported or merged into (default: brain_stats.duckdb next to this script)')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                        help='Import only shard i of N (0-based) into its own database in --shard-dir')
+    parser.add_argument('--shard-dir', type=Path, default=SHARD_DIR,
+                        help='Where --shard writes shard-i-of-N.duckdb (default: brain_stats_shards next to this script)')
+    parser.add_argument('--merge', nargs='+', type=Path, metavar='SHARD',
+                        help='Merge these shard databases into the main database instead of importing')
+    parser.add_argument('--archives', nargs='+', type=Path, metavar='ARCHIVE',
+                        help=f"Import from these {', '.join(ARCHIVE_SUFFIXES)} archives of run folders "
+                             "instead of --runs-dir")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes parsing zip members')
+    parser.add_argument('--filters', type=Path, default=FILTERS_FILE,
+                        help='JSON tag include/exclude rules per study pattern '
+                             '(default: brain_stats_import_filters.json next to this script, if present)')
+    parser.add_argument('--logs', nargs='*', type=Path, metavar='LOG',
+                        help='Import the lines appended to these text logs, or the log-*.txt in these folders, '
+                             'since the last import instead of --runs-dir (default: research_records next to '
+                             'this script)')
+    parser.add_argument('--log-extractors', type=Path, default=LOG_EXTRACTORS_FILE,
+                        help='JSON list of regex extractors for --logs '
+                             '(default: brain_stats_log_extractors.json next to this script, if present)')
+    parser.add_argument('--log-machine', default=socket.gethostname(),
+                        help='Machine name for the rows read from --logs (default: this host)')
     args = parser.parse_args()
+    filter_rules = load_tag_filters(args.filters)
+    
+    if args.merge:
+        merge_shards(args.merge, args.mode, args.db)
+        print(f"Done. {len(args.merge)} shards merged into {args.db} in {args.mode} mode")
+        return
+    
+    db_file = args.db
+    if args.shard:
+        args.shard_dir.mkdir(parents=True, exist_ok=True)
+        db_file = shard_file(args.shard_dir, *args.shard)
     
     # Set up database based on mode
-    setup_database(args.mode)
+    if args.output != 'parquet':
+        setup_database(args.mode, db_file)
+    if args.output != 'duckdb' and args.mode == 'reset' and args.parquet_dir.exists():
+        shutil.rmtree(args.parquet_dir)
+        print(f"Reset: Removed {args.parquet_dir}")
+    
+    def keep(study_name, machine_name):
+        return not args.shard or shard_of(study_name, machine_name, args.shard[1]) == args.shard[0]
+    
+    if args.archives:
+        for archive in args.archives:
+            import_archive(archive, keep, args.output, args.parquet_dir, db_file, args.workers, filter_rules)
+        target = {'duckdb': db_file, 'parquet': args.parquet_dir, 'both': f"{db_file} and {args.parquet_dir}"}
+        print(f"Done. {len(args.archives)} archives imported to {target[args.output]} in {args.mode} mode")
+        return
+    
+    if args.logs is not None:
+        extractors = load_log_extractors(args.log_extractors)
+        offsets = load_log_offsets(args.output, args.parquet_dir, db_file)
+        rows = 0
+        for log_file in tqdm(log_files(args.logs or [LOGS_DIR]), desc="Importing logs"):
+            if keep(log_file.stem, args.log_machine):
+                rows += import_log(log_file, args.log_machine, extractors, offsets, args.output, args.parquet_dir,
+                                   db_file, filter_rules)
+        target = {'duckdb': db_file, 'parquet': args.parquet_dir, 'both': f"{db_file} and {args.parquet_dir}"}
+        print(f"Done. {rows} new log values imported to {target[args.output]} in {args.mode} mode")
+        return
     
     # Gather all event files
     event_files = []
-    for subdir in RUNS_DIR.iterdir():
+    for subdir in args.runs_dir.iterdir():
         if not subdir.is_dir():
             continue
         study_name = subdir.name
         for event_file in subdir.glob('events.out.tfevents.*'):
+            if not keep(study_name, extract_machine_name(event_file)):
+                continue
             event_files.append((event_file, study_name))
 
     # Show progress bar while processing event files
     for event_file, study_name in tqdm(event_files, desc="Importing event files"):
-        process_event_file(event_file, study_name)
+        process_event_file(event_file, study_name, args.output, args.parquet_dir, db_file, filter_rules)
     
-    print(f"Done. Data imported to {DUCKDB_FILE} in {args.mode} mode")
+    target = {'duckdb': db_file, 'parquet': args.parquet_dir, 'both': f"{db_file} and {args.parquet_dir}"}
+    print(f"Done. Data imported to {target[args.output]} in {args.mode} mode")
 
 if __name__ == "__main__":
     main()
@@ -3,16 +3,35 @@ import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 from tkinter.scrolledtext import ScrolledText
-import duckdb
 import io
-from PIL import Image, ImageTk
-import matplotlib.pyplot as plt
-from matplotlib.ticker import AutoMinorLocator, LogLocator
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import base64
+import struct
 import json
 import os
 import datetime
-import numpy as np
+import importlib
+import threading
+import bisect
+import queue
+import time
+import functools
+import tracemalloc
+import argparse
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from brain_stats_repository import (
+    DB_PATH, MACHINE_MODE_COMBINED, MACHINE_MODE_SPLIT, MACHINE_MODE_BANDS,
+    REDUCER_LAST, REDUCER_MAX, REDUCER_MIN, REDUCER_MEAN_LAST_N, LEADERBOARD_PAGE_SIZE,
+    METRIC_VALUE, METRIC_STEPS_PER_SEC, METRIC_SEC_PER_STEP, METRIC_ETA, X_STEP, X_WALL_TIME,
+    BrainStatsRepository, scalar_source,
+)
+from brain_stats_plotting import (
+    COLOR_PALETTE, series_options, label_axes, format_tag_for_display, sanitize_filename,
+    style_axes, draw_plot_data, draw_multi_tag_plot,
+)
+# duckdb, numpy, PIL and matplotlib are imported inside the functions that use
+# them: together they take seconds to load and the window should not wait for them
 
 
 # replace the string "Brain" with "PGC" in the tag when displayed on the graphs/charts
@@ -26,7 +45,786 @@ def create_folder(path):
         messagebox.showerror("Error", f"Could not create folder:\n{e}")
         return False
 
-DB_PATH = 'brain_stats.duckdb'
+
+# Image scrubbing: decoded frames kept in memory and how far around the
+# current step the background decoder works ahead
+FRAME_CACHE_BYTES = 512 * 1024 * 1024
+PREFETCH_AHEAD = 16
+PREFETCH_BEHIND = 8
+SLIDER_COALESCE_MS = 15
+THUMBNAIL_SIZE = (1500, 1500)  # used until the image area has a real size
+RESIZE_DEBOUNCE_MS = 150
+
+# Contact sheet: default grid and how often finished thumbnails are collected
+SHEET_ROWS = 4
+SHEET_COLS = 6
+SHEET_POLL_MS = 30
+
+# Study filter: wait for a pause in typing, and never hand Tk more than
+# this many studies for the dropdown, the rest are reached through StudyPicker
+FILTER_DEBOUNCE_MS = 200
+STUDY_DROPDOWN_LIMIT = 1000
+
+# Live refresh: poll interval bounds, doubling while nothing changes
+LIVE_MIN_INTERVAL_MS = 1000
+LIVE_MAX_INTERVAL_MS = 30000
+
+# Startup: catalog queries and the restore of the last view run on a worker
+# thread, the Tk side checks for their results this often
+BACKGROUND_POLL_MS = 50
+HEAVY_MODULES = ['numpy', 'PIL.ImageTk', 'matplotlib.pyplot', 'matplotlib.backends.backend_tkagg']
+
+# Performance panel: operations kept, refresh rate and how many allocation
+# sites a tracemalloc snapshot lists
+PERF_HISTORY = 200
+PERF_PANEL_REFRESH_MS = 500
+PERF_TOP_ALLOCATIONS = 15
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def png_size(img_data):
+    """Read width and height from a PNG header, None if the blob is not a PNG"""
+    if len(img_data) < 24 or img_data[:8] != PNG_SIGNATURE:
+        return None
+    return struct.unpack('>II', img_data[16:24])
+
+
+def decode_frame(img_data, max_size=THUMBNAIL_SIZE):
+    """Decode an image blob so that it fits max_size.
+
+    PNGs that already fit are returned as the raw bytes for Tk's own PNG
+    loader. Everything else goes through PIL, letting JPEG decode at a
+    reduced scale (draft) and shrinking by whole factors (reduce) before
+    the final resample. reduce averages pixel values and only takes 8-bit
+    and 32-bit modes, so palette and 1-bit images are converted to RGBA/L
+    first and 16-bit ones scaled down to 8-bit grey.
+    """
+    from PIL import Image
+    size = png_size(img_data)
+    if size and size[0] <= max_size[0] and size[1] <= max_size[1]:
+        return bytes(img_data)
+    img = Image.open(io.BytesIO(img_data))
+    img.draft('RGB', max_size)
+    factor = min(img.width // max_size[0], img.height // max_size[1])
+    if img.mode.startswith('I;16'):
+        img = img.convert('I').point(lambda v: v / 256).convert('L')
+    if factor >= 2:
+        if img.mode in ('P', 'PA', '1'):
+            img = img.convert('L' if img.mode == '1' else 'RGBA')
+        img = img.reduce(factor)
+    img.thumbnail(max_size)
+    img.load()
+    return img
+
+
+def to_photo_image(frame):
+    """Turn a decoded frame into something Tk can show, must run on the Tk thread"""
+    from PIL import Image, ImageTk
+    if isinstance(frame, bytes):
+        try:
+            return tk.PhotoImage(data=base64.b64encode(frame))
+        except tk.TclError:
+            # Tk could not read this PNG variant, let PIL have a go
+            frame = Image.open(io.BytesIO(frame))
+    return ImageTk.PhotoImage(frame)
+
+
+def plot_key(study, tag, style):
+    """What a single-tag plot depends on, to match prefetched data against the view"""
+    return (study, tag, tuple(sorted(style.items())))
+
+
+def redraws_live(style):
+    """Whether Live has to draw the plot again instead of extending its lines:
+    lines against the wall time are not cut at a step, bands have no lines and
+    an ETA without a target counts down to the last step, which moves with every row"""
+    return (style['x_axis'] != X_STEP or style['machine_mode'] == MACHINE_MODE_BANDS
+            or (style['metric'] == METRIC_ETA and style['eta_target'] is None))
+
+
+def warm_up_imports():
+    """Import the modules the first plot and image need, meant for a worker thread"""
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+class NameIndex:
+    """Case-insensitive substring index over a sorted list of names.
+
+    The lowercased names are joined into one string, so a filter is a
+    handful of str.find calls running in C instead of a Python loop over
+    every name. Machine membership is kept as sets of positions.
+    """
+
+    def __init__(self, names, machine_names=None):
+        self.names = list(names)
+        self.haystack = '\n'.join(name.lower() for name in self.names)
+        self.starts = []
+        offset = 0
+        for name in self.names:
+            self.starts.append(offset)
+            offset += len(name) + 1
+        positions = {name: i for i, name in enumerate(self.names)}
+        self.by_machine = {}
+        for machine, name in machine_names or []:
+            if name in positions:
+                self.by_machine.setdefault(machine, set()).add(positions[name])
+
+    def __contains__(self, name):
+        i = bisect.bisect_left(self.names, name)
+        return i < len(self.names) and self.names[i] == name
+
+    def search(self, text='', machine=None):
+        """Names containing text (any case), optionally only those seen on machine"""
+        text = text.lower()
+        if text:
+            matches = []
+            pos = self.haystack.find(text)
+            while pos != -1:
+                idx = bisect.bisect_right(self.starts, pos) - 1
+                matches.append(idx)
+                # Skip to the next name, one hit per name is enough
+                next_start = self.starts[idx + 1] if idx + 1 < len(self.starts) else len(self.haystack)
+                pos = self.haystack.find(text, next_start)
+        else:
+            matches = range(len(self.names))
+        if machine is not None:
+            allowed = self.by_machine.get(machine, set())
+            matches = [i for i in matches if i in allowed]
+        return [self.names[i] for i in matches]
+
+
+class VirtualListbox:
+    """Multi-select list that only materializes the rows currently visible.
+
+    The Tk Listbox holds just one screenful of rows, the scrollbar is
+    driven from the full item list and selection is kept by item index.
+    """
+
+    def __init__(self, parent, on_select=None, selectmode=tk.MULTIPLE):
+        self.items = []
+        self.selected = set()
+        self.top = 0
+        self.rows = 20
+        self.on_select = on_select
+        self.selectmode = selectmode
+        self.listbox = tk.Listbox(parent, selectmode=selectmode, exportselection=0, height=self.rows)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.bind('<<ListboxSelect>>', self.on_listbox_select)
+        self.listbox.bind('<Configure>', self.on_configure)
+        self.listbox.bind('<MouseWheel>', self.on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll(3))
+
+    def set_items(self, items):
+        self.items = list(items)
+        self.selected.clear()
+        self.top = 0
+        self.render()
+
+    def selected_items(self):
+        return [self.items[i] for i in sorted(self.selected)]
+
+    def on_configure(self, event):
+        line_height = max(1, self.listbox.winfo_reqheight() // max(1, int(self.listbox['height'])))
+        rows = max(1, event.height // line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.render()
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return 'break'
+
+    def yview(self, *args):
+        """Scrollbar callback: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.items))
+            self.render()
+        elif args[0] == 'scroll':
+            amount = int(args[1]) * (self.rows if args[2] == 'pages' else 1)
+            self.scroll(amount)
+
+    def scroll(self, amount):
+        self.top += amount
+        self.render()
+        return 'break'
+
+    def render(self):
+        self.top = max(0, min(self.top, len(self.items) - self.rows))
+        visible = self.items[self.top:self.top + self.rows]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *visible)
+        for i in range(len(visible)):
+            if self.top + i in self.selected:
+                self.listbox.selection_set(i)
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), (self.top + len(visible)) / len(self.items))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def on_listbox_select(self, event):
+        shown = set(self.listbox.curselection())
+        if self.selectmode != tk.MULTIPLE:
+            # A single selection replaces the one scrolled out of view
+            self.selected = {self.top + i for i in shown}
+            if self.on_select:
+                self.on_select(event)
+            return
+        for i in range(self.listbox.size()):
+            if i in shown:
+                self.selected.add(self.top + i)
+            else:
+                self.selected.discard(self.top + i)
+        if self.on_select:
+            self.on_select(event)
+
+
+class StudyPicker:
+    """Window listing every study matching a filter, for when there are more than the dropdown holds"""
+
+    def __init__(self, app):
+        self.app = app
+        self.window = tk.Toplevel(app.root)
+        self.window.title('Studies')
+        self.window.geometry('500x600')
+
+        controls = ttk.Frame(self.window)
+        controls.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        ttk.Label(controls, text="Filter:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar(value=app.filter_var.get())
+        entry = ttk.Entry(controls, textvariable=self.filter_var)
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.filter_var.trace_add('write', lambda *args: self.refresh())
+        self.count_label = ttk.Label(controls, text="")
+        self.count_label.pack(side=tk.LEFT, padx=(10, 0))
+
+        list_frame = ttk.Frame(self.window)
+        list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+        self.listbox = VirtualListbox(list_frame, selectmode=tk.BROWSE)
+        self.listbox.listbox.bind('<Double-1>', self.pick)
+        self.listbox.listbox.bind('<Return>', self.pick)
+        entry.focus_set()
+        self.refresh()
+
+    def refresh(self):
+        # The index answers in C however many studies there are, no need to debounce
+        machine = self.app.machine_var.get()
+        studies = self.app.study_index.search(self.filter_var.get(), machine if machine != 'All' else None)
+        self.listbox.set_items(studies)
+        self.count_label.config(text=f"{len(studies)} studies")
+
+    def pick(self, event=None):
+        studies = self.listbox.selected_items()
+        if not studies:
+            return
+        self.app.study_var.set(studies[0])
+        self.app.on_study_selected()
+        self.app.save_settings()
+        self.window.destroy()
+
+
+class LeaderboardPanel:
+    """Window ranking all studies by one tag; double-click a row to plot it"""
+
+    def __init__(self, app):
+        self.app = app
+        self.page = 0
+        self.total = 0
+        self.window = tk.Toplevel(app.root)
+        self.window.title('Leaderboard')
+        self.window.geometry('700x500')
+
+        controls = ttk.Frame(self.window)
+        controls.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        ttk.Label(controls, text="Tag:").grid(row=0, column=0, sticky=tk.W)
+        self.tag_var = tk.StringVar(value=app.tag_var.get())
+        tags = app.repo.all_scalar_tags()
+        self.display_to_original = {app.format_tag_for_display(t): t for t in tags}
+        self.tag_cb = ttk.Combobox(controls, textvariable=self.tag_var, state='readonly', width=30,
+                                   values=list(self.display_to_original))
+        self.tag_cb.grid(row=0, column=1, sticky=tk.W)
+        self.tag_cb.bind('<<ComboboxSelected>>', self.refresh)
+        app.release_if_live()
+
+        ttk.Label(controls, text="Reducer:").grid(row=0, column=2, sticky=tk.W, padx=(10, 0))
+        self.reducer_var = tk.StringVar(value=REDUCER_LAST)
+        self.reducer_cb = ttk.Combobox(controls, textvariable=self.reducer_var, state='readonly', width=14,
+                                       values=[REDUCER_LAST, REDUCER_MAX, REDUCER_MIN, REDUCER_MEAN_LAST_N])
+        self.reducer_cb.grid(row=0, column=3, sticky=tk.W)
+        self.reducer_cb.bind('<<ComboboxSelected>>', self.refresh)
+
+        ttk.Label(controls, text="N:").grid(row=0, column=4, sticky=tk.W, padx=(10, 0))
+        self.last_n_var = tk.IntVar(value=10)
+        ttk.Spinbox(controls, from_=1, to=100000, textvariable=self.last_n_var, width=6,
+                    command=self.refresh).grid(row=0, column=5, sticky=tk.W)
+
+        self.ascending_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls, text="Lower is better", variable=self.ascending_var,
+                        command=self.refresh).grid(row=0, column=6, sticky=tk.W, padx=(10, 0))
+
+        columns = ('rank', 'study', 'score', 'last step')
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings')
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=300 if column == 'study' else 80, stretch=column == 'study', anchor=tk.W)
+        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5)
+        self.tree.bind('<Double-1>', self.on_row_double_click)
+
+        nav = ttk.Frame(self.window)
+        nav.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        self.prev_btn = ttk.Button(nav, text='Previous', command=lambda: self.change_page(-1))
+        self.next_btn = ttk.Button(nav, text='Next', command=lambda: self.change_page(1))
+        self.prev_btn.pack(side=tk.LEFT)
+        self.next_btn.pack(side=tk.LEFT)
+        self.page_label = ttk.Label(nav, text="")
+        self.page_label.pack(side=tk.LEFT, padx=10)
+
+        self.refresh()
+
+    def refresh(self, event=None):
+        """Re-rank from the first page"""
+        self.page = 0
+        self.load_page()
+
+    def change_page(self, delta):
+        self.page = max(0, self.page + delta)
+        self.load_page()
+
+    def load_page(self):
+        self.tree.delete(*self.tree.get_children())
+        display_tag = self.tag_var.get()
+        if not display_tag:
+            return
+        tag = self.display_to_original.get(display_tag, display_tag)
+        try:
+            last_n = max(1, self.last_n_var.get())
+        except tk.TclError:
+            last_n = 10
+        rows, self.total = self.app.repo.leaderboard(
+            tag, self.reducer_var.get(), last_n=last_n, ascending=self.ascending_var.get(),
+            limit=LEADERBOARD_PAGE_SIZE, offset=self.page * LEADERBOARD_PAGE_SIZE)
+        self.app.release_if_live()
+        for rank, study, score, last_step in rows:
+            self.tree.insert('', tk.END, values=(rank, study, f"{score:.6g}" if score is not None else '', last_step))
+        pages = max(1, -(-self.total // LEADERBOARD_PAGE_SIZE))
+        self.page_label.config(text=f"Page {self.page + 1} of {pages} ({self.total} studies)")
+        self.prev_btn.config(state=tk.NORMAL if self.page > 0 else tk.DISABLED)
+        self.next_btn.config(state=tk.NORMAL if self.page + 1 < pages else tk.DISABLED)
+
+    def on_row_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        if not item:
+            return
+        study = self.tree.item(item, 'values')[1]
+        self.app.open_plot(study, self.tag_var.get())
+
+
+class ContactSheet:
+    """Grid of evenly spaced frames of one image tag.
+
+    Only the step column of the series is kept in memory; the blobs of the
+    cells on screen are read per page and decoded on the app's frame
+    decoder pool, and cells fill in as their thumbnails finish. The first
+    page spreads over the whole run; with a smaller stride the pages are
+    consecutive blocks of rows * cols * stride steps.
+    """
+
+    def __init__(self, app, parent, rows=SHEET_ROWS, cols=SHEET_COLS):
+        self.app = app
+        self.rows = rows
+        self.cols = cols
+        self.frame = ttk.Frame(parent)
+        self.cells = []
+        for r in range(rows):
+            self.frame.rowconfigure(r, weight=1, uniform='sheet')
+            for c in range(cols):
+                self.frame.columnconfigure(c, weight=1, uniform='sheet')
+                cell = ttk.Label(self.frame, compound=tk.TOP, anchor=tk.CENTER)
+                cell.grid(row=r, column=c, sticky='nsew', padx=1, pady=1)
+                cell.bind('<MouseWheel>', self.on_mousewheel)
+                cell.bind('<Button-4>', lambda e: self.scroll(-1))
+                cell.bind('<Button-5>', lambda e: self.scroll(1))
+                self.cells.append(cell)
+        self.series = None
+        self.steps = []
+        self.start = 0
+        self.stride = 1
+        self.generation = 0
+        self.pending = 0
+        self.results = queue.SimpleQueue()
+        self.poll_id = None
+
+    def load(self, study, tag):
+        """Read the steps of a series and show the first page, spread over the whole run"""
+        self.series = (study, tag)
+        self.steps = self.app.repo.image_steps(study, tag)
+        self.app.release_if_live()
+        self.stride = self.overview_stride()
+        self.start = 0
+        self.render()
+
+    def overview_stride(self):
+        """Stride at which one page covers the whole run"""
+        return max(1, -(-len(self.steps) // (self.rows * self.cols)))
+
+    def last_start(self):
+        """First position of the last page, which ends on the last step"""
+        return max(0, len(self.steps) - 1 - (self.rows * self.cols - 1) * self.stride)
+
+    def set_stride(self, stride):
+        """Show every stride-th step from the current top-left cell on"""
+        self.stride = max(1, min(stride, self.overview_stride()))
+        self.start = min(self.start, self.last_start())
+        if len(self.steps):
+            self.render()
+
+    def on_mousewheel(self, event):
+        self.scroll(-1 if event.delta > 0 else 1)
+
+    def scroll(self, rows):
+        """Move the sheet by whole rows of cells, the steps in between are not skipped over
+        unless the stride says so"""
+        if not len(self.steps):
+            return
+        start = self.start + rows * self.cols * self.stride
+        self.start = max(0, min(start, self.last_start()))
+        self.render()
+
+    def cell_size(self):
+        width = self.frame.winfo_width() // self.cols - 4
+        height = self.frame.winfo_height() // self.rows - 24  # room for the step caption
+        if width <= 1 or height <= 1:
+            return (160, 120)
+        return (width, height)
+
+    def render(self):
+        """Show the current page: cached thumbnails at once, the rest as they are decoded"""
+        import numpy as np
+        self.generation += 1
+        positions = self.start + np.arange(self.rows * self.cols) * self.stride
+        page_steps = self.steps[positions[positions < len(self.steps)]]
+        self.app.sample_id_label.config(
+            text=f"Steps {page_steps[0]}-{page_steps[-1]} of {len(self.steps)} images, showing every {self.stride}")
+        size = self.cell_size()
+        blobs = self.app.repo.image_payload(self.series[0], self.series[1], page_steps)
+        self.app.release_if_live()
+        self.pending = 0
+        for i, cell in enumerate(self.cells):
+            cell.image = None
+            if i >= len(page_steps):
+                cell.config(image='', text='')
+                continue
+            step = int(page_steps[i])
+            cell.config(image='', text=f"Step {step}")
+            key = (self.series, ('sheet', step), size)
+            frame = self.app.frame_cache.get(key)
+            if frame is not None:
+                self.show_cell(cell, step, frame)
+            elif step in blobs:
+                self.pending += 1
+                self.app.decode_pool.submit(self.decode_job, self.generation, i, step, key, blobs[step])
+        if self.pending and self.poll_id is None:
+            self.poll_id = self.app.root.after(SHEET_POLL_MS, self.poll_results)
+
+    def decode_job(self, generation, i, step, key, img_data):
+        """Runs on the decoder pool, results go back to the Tk thread through the queue"""
+        if generation != self.generation:
+            self.results.put((generation, i, step, None))
+            return
+        try:
+            frame = decode_frame(img_data, key[2])
+            self.app.frame_cache.put(key, frame)
+        except Exception as e:
+            print(f"Could not decode thumbnail for step {step}: {e}")
+            frame = None
+        self.results.put((generation, i, step, frame))
+
+    def poll_results(self):
+        self.poll_id = None
+        while True:
+            try:
+                generation, i, step, frame = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            self.pending -= 1
+            if frame is not None:
+                self.show_cell(self.cells[i], step, frame)
+        if self.pending > 0:
+            self.poll_id = self.app.root.after(SHEET_POLL_MS, self.poll_results)
+
+    def show_cell(self, cell, step, frame):
+        img_tk = to_photo_image(frame)
+        cell.config(image=img_tk, text=f"Step {step}")
+        cell.image = img_tk
+
+
+def frame_bytes(frame):
+    """Approximate memory held by a cached frame: pixels of a decoded image, length of an encoded one"""
+    if isinstance(frame, bytes):
+        return len(frame)
+    return frame.width * frame.height * len(frame.getbands())
+
+
+class FrameCache:
+    """Thread-safe LRU cache of decoded, resized image frames, bounded by their approximate size.
+
+    Frames at display size run to several MB each and the contact sheet
+    shares the cache, so a count alone says little about memory.
+    """
+
+    def __init__(self, capacity=FRAME_CACHE_BYTES):
+        self.capacity = capacity
+        self.size = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.size -= frame_bytes(old)
+            self._frames[key] = frame
+            self.size += frame_bytes(frame)
+            # The newest frame stays even if it alone is over the limit
+            while self.size > self.capacity and len(self._frames) > 1:
+                _, evicted = self._frames.popitem(last=False)
+                self.size -= frame_bytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.size = 0
+
+
+class PerfMonitor:
+    """Wall-clock timings of the viewer's data and render operations.
+
+    An operation is one step the user waits for (show_scalar_plot,
+    load_images, ...) and phases split it into query, draw, render and so
+    on. Finished operations go into a short history, to the listeners when
+    they ran on the Tk thread, and to the JSONL trace file if one is open.
+    """
+
+    def __init__(self, history=PERF_HISTORY):
+        self.records = deque(maxlen=history)
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.local = threading.local()  # stack of open operations per thread
+        self.trace_file = None
+        self.trace_path = None
+        self.last_snapshot = None
+
+    @contextmanager
+    def operation(self, name, **fields):
+        record = {'ts': time.time(), 'op': name, 'thread': threading.current_thread().name, **fields, 'phases': {}}
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = round((time.perf_counter() - start) * 1000, 3)
+            stack.pop()
+            if stack:
+                # A nested operation also shows up as a phase of the outer one
+                phases = stack[-1]['phases']
+                phases[name] = round(phases.get(name, 0) + record['ms'], 3)
+            self.finish(record)
+
+    @contextmanager
+    def phase(self, name):
+        """Time part of the current operation, a no-op outside of one"""
+        stack = getattr(self.local, 'stack', None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if stack:
+                phases = stack[-1]['phases']
+                phases[name] = round(phases.get(name, 0) + (time.perf_counter() - start) * 1000, 3)
+
+    def note(self, **fields):
+        """Attach extra fields (cache hit, row count, ...) to the current operation"""
+        stack = getattr(self.local, 'stack', None)
+        if stack:
+            stack[-1].update(fields)
+
+    def finish(self, record):
+        with self.lock:
+            self.records.append(record)
+            if self.trace_file:
+                self.trace_file.write(json.dumps(record, default=str) + '\n')
+                self.trace_file.flush()
+        if threading.current_thread() is threading.main_thread():
+            for listener in self.listeners:
+                listener(record)
+
+    def start_trace(self, path):
+        """Append every finished operation to path, one JSON object per line"""
+        self.stop_trace()
+        with self.lock:
+            self.trace_file = open(path, 'a')
+            self.trace_path = path
+
+    def stop_trace(self):
+        with self.lock:
+            if self.trace_file:
+                self.trace_file.close()
+            self.trace_file = None
+            self.trace_path = None
+
+    def memory_snapshot(self, limit=PERF_TOP_ALLOCATIONS):
+        """Start tracemalloc on the first call; later calls report the biggest
+        allocation sites and what grew since the call before, or None on the first"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.last_snapshot = tracemalloc.take_snapshot()
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        current, peak = tracemalloc.get_traced_memory()
+        record = {
+            'ts': time.time(), 'op': 'tracemalloc', 'thread': threading.current_thread().name,
+            'current_kb': current // 1024, 'peak_kb': peak // 1024,
+            'top': [str(stat) for stat in snapshot.statistics('lineno')[:limit]],
+            'growth': [str(stat) for stat in snapshot.compare_to(self.last_snapshot, 'lineno')[:limit]],
+        }
+        self.last_snapshot = snapshot
+        self.finish(record)
+        return record
+
+
+def format_perf_record(record):
+    """One line for the status bar: total and the phases of an operation"""
+    if record['op'] == 'tracemalloc':
+        return f"tracemalloc: {record['current_kb']} KB traced, peak {record['peak_kb']} KB"
+    phases = ', '.join(f"{name} {ms:.0f}" for name, ms in record['phases'].items())
+    return f"{record['op']} {record['ms']:.0f} ms" + (f"  ({phases})" if phases else '')
+
+
+def timed(method):
+    """Run a BrainStatsUI method as a PerfMonitor operation named after it"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            with self.perf.operation(method.__name__, study=self.study_var.get(), tag=self.tag_var.get()):
+                return method(self, *args, **kwargs)
+        finally:
+            self.release_if_live()
+    return wrapper
+
+
+class PerfPanel:
+    """Window with the latest operation timings, the JSONL trace switch and tracemalloc snapshots"""
+
+    def __init__(self, app):
+        self.app = app
+        self.perf = app.perf
+        self.shown = None
+        self.window = tk.Toplevel(app.root)
+        self.window.title('Performance')
+        self.window.geometry('800x550')
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+
+        controls = ttk.Frame(self.window)
+        controls.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        ttk.Button(controls, text='Clear', command=self.clear).pack(side=tk.LEFT)
+        self.trace_btn = ttk.Button(controls, command=self.toggle_trace)
+        self.trace_btn.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(controls, text='Memory snapshot', command=self.take_memory_snapshot).pack(side=tk.LEFT, padx=(10, 0))
+        self.trace_label = ttk.Label(controls, text='')
+        self.trace_label.pack(side=tk.LEFT, padx=10)
+
+        columns = ('time', 'operation', 'ms', 'phases (ms)', 'study / tag')
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings')
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=250 if column in ('phases (ms)', 'study / tag') else 80,
+                             stretch=column in ('phases (ms)', 'study / tag'), anchor=tk.W)
+        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5)
+
+        self.memory_text = ScrolledText(self.window, height=10, wrap=tk.NONE)
+        self.memory_text.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        self.memory_text.insert(tk.END, "Memory snapshot starts tracemalloc, the next one lists the biggest allocations.\n")
+
+        self.update_trace_controls()
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the table when operations finished since the last look"""
+        with self.perf.lock:
+            records = list(self.perf.records)
+        latest = (len(records), id(records[-1]) if records else None)
+        if latest != self.shown:
+            self.shown = latest
+            self.tree.delete(*self.tree.get_children())
+            for record in reversed(records):
+                if record['op'] == 'tracemalloc':
+                    continue
+                phases = ', '.join(f"{name} {ms:.1f}" for name, ms in record['phases'].items())
+                where = ' / '.join(str(record[k]) for k in ('study', 'tag') if record.get(k))
+                self.tree.insert('', tk.END, values=(
+                    datetime.datetime.fromtimestamp(record['ts']).strftime('%H:%M:%S'),
+                    record['op'], f"{record['ms']:.1f}", phases, where))
+        self.after_id = self.window.after(PERF_PANEL_REFRESH_MS, self.refresh)
+
+    def clear(self):
+        with self.perf.lock:
+            self.perf.records.clear()
+
+    def toggle_trace(self):
+        if self.perf.trace_file:
+            self.perf.stop_trace()
+        else:
+            path = filedialog.asksaveasfilename(parent=self.window, title='Append timings to',
+                                                defaultextension='.jsonl', initialfile='viewer_trace.jsonl',
+                                                filetypes=[('JSON lines', '*.jsonl'), ('All files', '*.*')],
+                                                confirmoverwrite=False)
+            if not path:
+                return
+            self.perf.start_trace(path)
+        self.update_trace_controls()
+
+    def update_trace_controls(self):
+        if self.perf.trace_file:
+            self.trace_btn.config(text='Stop trace')
+            self.trace_label.config(text=f"Tracing to {self.perf.trace_path}")
+        else:
+            self.trace_btn.config(text='Trace to file...')
+            self.trace_label.config(text='')
+
+    def take_memory_snapshot(self):
+        record = self.perf.memory_snapshot()
+        self.memory_text.delete('1.0', tk.END)
+        if record is None:
+            self.memory_text.insert(tk.END, "tracemalloc started. Use the viewer, then take another snapshot.\n")
+            return
+        lines = [f"Traced {record['current_kb']} KB, peak {record['peak_kb']} KB", "", "Largest allocation sites:"]
+        lines += record['top'] + ["", "Growth since the previous snapshot:"] + record['growth']
+        self.memory_text.insert(tk.END, '\n'.join(lines))
+
+    def close(self):
+        self.window.after_cancel(self.after_id)
+        self.window.destroy()
+        self.app.perf_panel = None
+
 
 class BrainStatsUI:
     def create_folder_and_save_plot(self):
@@ -42,7 +840,7 @@ class BrainStatsUI:
             return
         self.save_plot_as_png(initialdir=new_folder)
 
-    def __init__(self, root):
+    def __init__(self, root, trace_path=None, db_sources=None):
         self.root = root
         self.root.title('PGC Stats Viewer')
         try:
@@ -54,18 +852,53 @@ class BrainStatsUI:
             except Exception:
                 pass  # Ignore icon error if running on Linux/Wayland or missing icon
         self._icon_img = icon_img if 'icon_img' in locals() else None  # Prevent garbage collection
-        self.con = duckdb.connect(DB_PATH, read_only=True)
+        # Timings of every data and render step, see PerfMonitor
+        self.perf = PerfMonitor()
+        self.perf_panel = None
+        if trace_path:
+            self.perf.start_trace(trace_path)
+        
+        # The connection and the catalog come from a worker thread, see load_catalog
+        self.repo = BrainStatsRepository(db_sources or DB_PATH)
+        self.catalog_loaded = False
+        self.background_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog')
         self.settings_file = 'brain_stats_settings.json'
+        self.last_settings = {'last_study': '', 'last_type': '', 'last_tag': '', 'last_machine': ''}
+        self.prefetched_plot = None
+        # Picture of the last plot, shown at startup until the real one is drawn
+        self.snapshot_file = os.path.splitext(self.settings_file)[0] + '_snapshot.png'
+        self.snapshot_fingerprint = None
+        self.snapshot_label = None
+        self.current_fingerprint = None
+        
+        # Decoded image frames and the background decoder that fills them
+        self.frame_cache = FrameCache()
+        self.decode_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='frame-decoder')
+        self.pending_frames = {}  # cache key -> Future
+        self.pending_lock = threading.Lock()
+        self.image_series = None
+        self.slider_target = None
+        self.slider_after_id = None
+        self.display_size = THUMBNAIL_SIZE
+        self.resize_after_id = None
         
-        # Get available machines
-        self.machines = ['All'] + self.load_machines()
+        # Filled in by on_catalog_loaded
+        self.machines = ['All']
+        self.studies = []
+        self.study_index = NameIndex([])
+        self.filtered_studies = []
         
-        # Define color palette for multiple lines
-        self.color_palette = ['blue', 'red', 'green', 'purple', 'orange', 'brown', 'pink', 'gray', 'olive', 'cyan']
+        self.color_palette = COLOR_PALETTE
         
         self.setup_widgets()
+        self.perf.listeners.append(lambda record: self.status_var.set(format_perf_record(record)))
         self.load_settings()
-        self.load_studies()
+        self.show_snapshot()
+        self.study_cb.config(state='disabled')
+        style = self.plot_style()
+        self.run_in_background('load_catalog', lambda: self.load_catalog(style), self.on_catalog_loaded)
+        # Let the plotting imports load while the catalog is shown
+        self.background_pool.submit(warm_up_imports)
         
         # Save settings when closing the app
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -96,14 +929,18 @@ class BrainStatsUI:
         # Study selector (row 1)
         ttk.Label(controls_frame, text="Study:").grid(row=1, column=0, sticky=tk.W)
         self.study_var = tk.StringVar()
-        self.study_cb = ttk.Combobox(controls_frame, textvariable=self.study_var, state='readonly', width=40)
+        # Values are handed to the dropdown only when it opens, see populate_study_dropdown
+        self.study_cb = ttk.Combobox(controls_frame, textvariable=self.study_var, state='readonly', width=40,
+                                     postcommand=self.populate_study_dropdown)
         self.study_cb.grid(row=1, column=1, columnspan=5, sticky=tk.W+tk.E, ipady=0, pady=0)
+        ttk.Button(controls_frame, text="Browse...", command=self.show_study_picker).grid(
+            row=1, column=6, sticky=tk.W, padx=(5, 0), ipady=0, pady=0)
         self.study_cb.bind('<<ComboboxSelected>>', self.on_study_selected)
 
         # Type and Tag selectors (row 2)
         ttk.Label(controls_frame, text="Type:").grid(row=2, column=0, sticky=tk.W)
         self.type_var = tk.StringVar(value='scalar')
-        self.type_cb = ttk.Combobox(controls_frame, textvariable=self.type_var, state='readonly', values=['scalar', 'image'])
+        self.type_cb = ttk.Combobox(controls_frame, textvariable=self.type_var, state='readonly', values=['scalar', 'image', 'histogram'])
         self.type_cb.grid(row=2, column=1, sticky=tk.W, ipady=0, pady=0)
         self.type_cb.bind('<<ComboboxSelected>>', self.on_type_selected)
 
@@ -147,8 +984,65 @@ class BrainStatsUI:
         self.line_color_cb = ttk.Combobox(controls_frame, textvariable=self.line_color_var, state='readonly', 
                                       values=["blue", "black", "red", "green", "orange", "purple"])
         self.line_color_cb.grid(row=3, column=3, sticky=tk.W, ipady=0, pady=0)
+
+        # Live refresh checkbox (row 3)
+        self.live_var = tk.BooleanVar(value=False)
+        self.live_cb = ttk.Checkbutton(controls_frame, text="Live", variable=self.live_var, command=self.on_live_toggle)
+        self.live_cb.grid(row=3, column=4, sticky=tk.W, padx=(10, 0), ipady=0, pady=0)
+
+        # Machine mode selection (row 3)
+        ttk.Label(controls_frame, text="Machines:").grid(row=3, column=5, sticky=tk.W)
+        self.machine_mode_var = tk.StringVar(value=MACHINE_MODE_COMBINED)
+        self.machine_mode_cb = ttk.Combobox(controls_frame, textvariable=self.machine_mode_var, state='readonly', width=16,
+                                            values=[MACHINE_MODE_COMBINED, MACHINE_MODE_SPLIT, MACHINE_MODE_BANDS])
+        self.machine_mode_cb.grid(row=3, column=6, columnspan=2, sticky=tk.W, ipady=0, pady=0)
+        self.machine_mode_cb.bind('<<ComboboxSelected>>', self.on_plot_parameter_change)
+
+        # Leaderboard button (row 3)
+        ttk.Button(controls_frame, text="Leaderboard...", command=self.show_leaderboard).grid(
+            row=3, column=8, sticky=tk.W, padx=(10, 0), ipady=0, pady=0)
+
+        # Training speed from wall_time instead of the values, and the x axis (row 4)
+        ttk.Label(controls_frame, text="Y:").grid(row=4, column=0, sticky=tk.W)
+        self.metric_var = tk.StringVar(value=METRIC_VALUE)
+        self.metric_cb = ttk.Combobox(controls_frame, textvariable=self.metric_var, state='readonly',
+                                      values=[METRIC_VALUE, METRIC_STEPS_PER_SEC, METRIC_SEC_PER_STEP, METRIC_ETA])
+        self.metric_cb.grid(row=4, column=1, sticky=tk.W, ipady=0, pady=0)
+        self.metric_cb.bind('<<ComboboxSelected>>', self.on_plot_parameter_change)
+
+        ttk.Label(controls_frame, text="X:").grid(row=4, column=2, sticky=tk.W)
+        self.x_axis_var = tk.StringVar(value=X_STEP)
+        self.x_axis_cb = ttk.Combobox(controls_frame, textvariable=self.x_axis_var, state='readonly',
+                                      values=[X_STEP, X_WALL_TIME])
+        self.x_axis_cb.grid(row=4, column=3, sticky=tk.W, ipady=0, pady=0)
+        self.x_axis_cb.bind('<<ComboboxSelected>>', self.on_plot_parameter_change)
+
+        # Rows the speed is averaged over
+        ttk.Label(controls_frame, text="Smoothing:").grid(row=4, column=4, sticky=tk.W, padx=(10, 0))
+        self.smoothing_var = tk.StringVar(value='1')
+        self.smoothing_sb = ttk.Spinbox(controls_frame, textvariable=self.smoothing_var, from_=1, to=10000, width=6,
+                                        command=self.on_plot_parameter_change)
+        self.smoothing_sb.grid(row=4, column=5, sticky=tk.W, ipady=0, pady=0)
+        self.smoothing_sb.bind('<Return>', self.on_plot_parameter_change)
+
+        # Empty: the last step any machine has reached
+        ttk.Label(controls_frame, text="ETA step:").grid(row=4, column=6, sticky=tk.W)
+        self.eta_target_var = tk.StringVar(value='')
+        self.eta_target_entry = ttk.Entry(controls_frame, textvariable=self.eta_target_var, width=10)
+        self.eta_target_entry.grid(row=4, column=7, sticky=tk.W, ipady=0, pady=0)
+        self.eta_target_entry.bind('<Return>', self.on_plot_parameter_change)
+        self.live_after_id = None
+        self.live_lines = {}  # (study, tag) -> Line2D of the plot on screen
+        self.live_redraw = False  # plot on screen cannot be extended in place, Live draws it again
         self.line_color_cb.bind('<<ComboboxSelected>>', self.on_plot_parameter_change)
 
+        # Status bar with the timing of the last operation (packed before the panes so it keeps its row)
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+        self.status_var = tk.StringVar(value='')
+        ttk.Label(status_frame, textvariable=self.status_var, anchor=tk.W).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(status_frame, text="Performance...", command=self.toggle_perf_panel).pack(side=tk.RIGHT)
+
         # Paned window for resizable split
         self.paned = ttk.PanedWindow(self.root, orient=tk.VERTICAL)
         self.paned.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
@@ -172,18 +1066,20 @@ class BrainStatsUI:
         listbox_frame = ttk.Frame(tag_list_container)
         listbox_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.tag_listbox = tk.Listbox(listbox_frame, selectmode=tk.MULTIPLE, exportselection=0)
-        self.tag_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.tag_listbox.bind('<<ListboxSelect>>', self.on_tag_listbox_select)
-        
-        tag_scrollbar = ttk.Scrollbar(listbox_frame, orient=tk.VERTICAL, command=self.tag_listbox.yview)
-        tag_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tag_listbox.config(yscrollcommand=tag_scrollbar.set)
+        self.tag_listbox = VirtualListbox(listbox_frame, on_select=self.on_tag_listbox_select)
         
         # Plot button
         self.plot_button = ttk.Button(tag_list_container, text="Plot Selected", command=self.plot_selected_tags)
         self.plot_button.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
         
+        # Summary statistics of the selected tags, read from the importer's series_stats table
+        stats_columns = ('tag', 'machine', 'n', 'last', 'min', 'max', 'mean', 'std')
+        self.stats_tree = ttk.Treeview(tag_list_container, columns=stats_columns, show='headings', height=4)
+        for column in stats_columns:
+            self.stats_tree.heading(column, text=column)
+            self.stats_tree.column(column, width=120 if column == 'tag' else 60, stretch=column == 'tag', anchor=tk.W)
+        self.stats_tree.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+        
         # Right side: plot area
         self.plot_frame = ttk.Frame(self.plot_pane)
         self.plot_pane.add(self.plot_frame, weight=3)
@@ -208,65 +1104,132 @@ class BrainStatsUI:
         self.next_btn = ttk.Button(self.image_nav_frame, text='Next', command=self.next_image)
         self.prev_btn.pack(side=tk.LEFT)
         self.next_btn.pack(side=tk.LEFT)
+        # Contact sheet toggle: many steps at once instead of one image
+        self.sheet_var = tk.BooleanVar(value=False)
+        self.sheet_cb = ttk.Checkbutton(self.image_nav_frame, text="Contact sheet", variable=self.sheet_var,
+                                        command=self.on_sheet_toggle)
+        self.sheet_cb.pack(side=tk.LEFT, padx=(10, 0))
+        # Every n-th image on the sheet, lower it to page through a stretch of the run
+        ttk.Label(self.image_nav_frame, text="Every:").pack(side=tk.LEFT, padx=(10, 0))
+        self.sheet_stride_var = tk.StringVar(value='1')
+        self.sheet_stride_sb = ttk.Spinbox(self.image_nav_frame, textvariable=self.sheet_stride_var, from_=1, to=1,
+                                           width=6, state=tk.DISABLED, command=self.on_sheet_stride_change)
+        self.sheet_stride_sb.pack(side=tk.LEFT)
+        self.sheet_stride_sb.bind('<Return>', self.on_sheet_stride_change)
+        self.contact_sheet = ContactSheet(self, self.image_frame)
         # Add slider for image navigation
         self.image_slider = tk.Scale(self.image_frame, from_=0, to=0, orient=tk.HORIZONTAL, showvalue=0, command=self.on_slider_move)
         self.image_slider.grid(row=3, column=0, sticky='ew', pady=5)
+        self.image_frame.bind("<Configure>", self.on_image_frame_configure)
         self.img_idx = 0
         self.images = []
         # Do not destroy image_label or image_nav_frame, only update their content
         self.hide_image_widgets()
 
-    def load_machines(self):
-        """Load all available machine names from the database"""
-        machines = [row[0] for row in self.con.execute("SELECT DISTINCT machine FROM scalars").fetchall()]
-        return sorted(machines)
-    
-    def load_studies(self):
-        studies = [row[0] for row in self.con.execute("SELECT DISTINCT study FROM scalars").fetchall()]
-        self.studies = sorted(studies)
+    def run_in_background(self, name, job, on_done):
+        """Run job on the worker thread as operation name and hand its result to on_done on the Tk thread"""
+        def run():
+            with self.perf.operation(name):
+                return job()
+
+        future = self.background_pool.submit(run)
+
+        def check():
+            if not future.done():
+                self.root.after(BACKGROUND_POLL_MS, check)
+                return
+            try:
+                result = future.result()
+            except CancelledError:
+                return
+            except Exception as e:
+                print(f"Background task failed: {e}")
+                return
+            on_done(result)
+
+        self.root.after(BACKGROUND_POLL_MS, check)
+
+    def load_catalog(self, style):
+        """Worker thread: open the database, list machines and studies, prefetch the last plot"""
+        # A repository of its own, connections are not shared between threads
+        repo = BrainStatsRepository(self.repo.sources)
+        with self.perf.phase('connect'):
+            repo.con
+        with self.perf.phase('catalog'):
+            machines, studies, pairs = repo.catalog()
+
+        # The last scalar plot is fetched here too, show_scalar_plot picks it up. If its
+        # fingerprint still matches the snapshot, the data is not needed at all
+        prefetched = None
+        last_study, last_tag = self.last_settings['last_study'], self.last_settings['last_tag']
+        if self.last_settings['last_type'] == 'scalar' and last_study in set(studies):
+            tags = repo.tags(last_study)
+            original = next((tag for tag in tags if format_tag_for_display(tag) == last_tag), None)
+            if original is not None:
+                with self.perf.phase('fingerprint'):
+                    fingerprint = repo.fingerprint(last_study, original, style)
+                data = None
+                if fingerprint != self.snapshot_fingerprint:
+                    with self.perf.phase('query'):
+                        data = repo.plot_data(last_study, [original], style['machine_mode'], **series_options(style))
+                prefetched = (plot_key(last_study, original, style), data, fingerprint)
+        return repo, machines, studies, pairs, prefetched
+
+    def on_catalog_loaded(self, result):
+        repo, machines, self.studies, pairs, self.prefetched_plot = result
+        if not self.repo.is_open:
+            self.repo = repo
+        else:
+            repo.close()
+        self.machines = ['All'] + machines
+        self.machine_cb['values'] = self.machines
+        if self.last_settings['last_machine'] in self.machines:
+            self.machine_var.set(self.last_settings['last_machine'])
+        # Index the studies once per snapshot so filtering never goes back to the database
+        self.study_index = NameIndex(self.studies, pairs)
+        self.study_cb.config(state='readonly')
+        self.catalog_loaded = True
         self.update_study_list()
+        self.release_if_live()
 
     def on_filter_change(self, *args):
-        self.update_study_list()
+        """Filter once typing pauses instead of on every keystroke"""
+        if getattr(self, 'filter_timer_id', None):
+            self.root.after_cancel(self.filter_timer_id)
+        self.filter_timer_id = self.root.after(FILTER_DEBOUNCE_MS, self.update_study_list)
+
+    def populate_study_dropdown(self):
+        """Fill the study dropdown right before it opens"""
+        self.study_cb['values'] = self.filtered_studies[:STUDY_DROPDOWN_LIMIT]
+        hidden = len(self.filtered_studies) - STUDY_DROPDOWN_LIMIT
+        if hidden > 0:
+            self.status_var.set(f"{hidden} more studies not in the list, refine the filter or use Browse...")
+
+    def show_study_picker(self):
+        if self.catalog_loaded:
+            StudyPicker(self)
 
     def update_study_list(self):
-        filter_text = self.filter_var.get().lower()
+        self.filter_timer_id = None
+        filter_text = self.filter_var.get()
         machine_filter = self.machine_var.get()
         
-        # Apply machine filter if not 'All'
-        if machine_filter != 'All':
-            # Get studies for the selected machine
-            query = "SELECT DISTINCT study FROM scalars WHERE machine = ?"
-            machine_studies = [row[0] for row in self.con.execute(query, [machine_filter]).fetchall()]
-            # Filter the studies list
-            filtered_by_machine = [s for s in self.studies if s in machine_studies]
-        else:
-            filtered_by_machine = self.studies
-        
-        # Then apply text filter
-        if filter_text:
-            filtered_studies = [s for s in filtered_by_machine if filter_text in s.lower()]
-        else:
-            filtered_studies = filtered_by_machine
-            
-        self.study_cb['values'] = filtered_studies
+        # Apply machine filter if not 'All', then the text filter
+        machine = machine_filter if machine_filter != 'All' else None
+        filtered_studies = self.study_index.search(filter_text, machine)
+        self.filtered_studies = filtered_studies
         
         # Try to maintain current selection if it's still in the filtered list
         current_study = self.study_var.get()
         if filtered_studies:
-            if current_study not in filtered_studies:
-                # Restore last selected values if they exist
-                if 'last_machine' in self.last_settings and self.last_settings['last_machine'] in self.machines:
-                    self.machine_var.set(self.last_settings['last_machine'])
-                
-                if 'last_study' in self.last_settings and self.last_settings['last_study'] in self.studies:
-                    self.study_var.set(self.last_settings['last_study'])
-                    self.on_study_selected()
-                
-                if 'last_type' in self.last_settings:
+            if current_study not in set(filtered_studies):
+                # Restore the last viewed study and type if they are still there
+                if self.last_settings['last_type'] in self.type_cb['values']:
                     self.type_var.set(self.last_settings['last_type'])
-                    self.on_type_selected()
-                self.study_cb.current(0)
+                if self.last_settings['last_study'] in set(filtered_studies):
+                    self.study_var.set(self.last_settings['last_study'])
+                else:
+                    self.study_var.set(filtered_studies[0])
                 self.on_study_selected()
         else:
             self.study_var.set('')
@@ -285,14 +1248,11 @@ class BrainStatsUI:
         if self.type_var.get() == 'scalar':
             self.show_scalar_plot()
 
+    @timed
     def load_tags(self, study, value_type):
         if not study:
             return
-        if value_type == 'scalar':
-            tags = [row[0] for row in self.con.execute("SELECT DISTINCT tag FROM scalars WHERE study=?", [study]).fetchall()]
-        else:
-            tags = [row[0] for row in self.con.execute("SELECT DISTINCT tag FROM images WHERE study=?", [study]).fetchall()]
-        tags = sorted(tags)
+        tags = self.repo.tags(study, value_type)
         
         # Store original tags but display formatted tags
         self.original_tags = tags
@@ -302,16 +1262,14 @@ class BrainStatsUI:
         self.tag_cb['values'] = display_tags
         
         # Update the tag listbox for multi-selection
-        self.tag_listbox.delete(0, tk.END)  # Clear existing items
-        for display_tag in display_tags:
-            self.tag_listbox.insert(tk.END, display_tag)
+        self.tag_listbox.set_items(display_tags)
             
         # Create mapping from display tag to original tag
         self.display_to_original = {display_tags[i]: tags[i] for i in range(len(tags))}
         
         if tags:
-            # Try to restore saved tag if available
-            if hasattr(self, 'last_settings') and self.last_settings['last_tag'] in tags:
+            # Try to restore saved tag if available, it is saved as shown in the combobox
+            if hasattr(self, 'last_settings') and self.last_settings['last_tag'] in self.display_to_original:
                 self.tag_var.set(self.last_settings['last_tag'])
             else:
                 self.tag_cb.current(0)
@@ -319,8 +1277,9 @@ class BrainStatsUI:
         else:
             # No tags available for this study/type
             self.tag_var.set('')
-            if value_type == 'scalar':
+            if value_type in ('scalar', 'histogram'):
                 # Clear any existing plot
+                self.hide_snapshot()
                 if hasattr(self, 'scalar_canvas'):
                     self.scalar_canvas.get_tk_widget().pack_forget()
             else:
@@ -332,6 +1291,11 @@ class BrainStatsUI:
     def on_tag_selected(self, event=None):
         if self.type_var.get() == 'scalar':
             self.show_scalar_plot()
+            self.show_series_stats()
+        elif self.type_var.get() == 'histogram':
+            self.show_histogram_heatmap()
+        elif self.sheet_var.get():
+            self.show_contact_sheet()
         else:
             self.load_images()
             self.show_image()
@@ -340,6 +1304,8 @@ class BrainStatsUI:
         """Unified handler for any plot parameter change (log scale, dots, grid, colors)"""
         if self.type_var.get() == 'scalar':
             self.show_scalar_plot()
+        elif self.type_var.get() == 'histogram':
+            self.show_histogram_heatmap()
         self.save_settings()
         
     def save_settings(self):
@@ -362,6 +1328,11 @@ class BrainStatsUI:
             'v_grid': self.vgrid_var.get(),
             'grid_color': self.grid_color_var.get(),
             'line_color': self.line_color_var.get(),
+            'machine_mode': self.machine_mode_var.get(),
+            'metric': self.metric_var.get(),
+            'x_axis': self.x_axis_var.get(),
+            'smoothing': self.smoothing(),
+            'eta_target': self.eta_target(),
             
             # Last viewed data
             'last_study': self.study_var.get() if hasattr(self, 'study_var') else '',
@@ -371,8 +1342,14 @@ class BrainStatsUI:
             
             # Window layout
             'window_geometry': geometry,
-            'pane_sash_position': sash_pos
+            'pane_sash_position': sash_pos,
+            
+            # What the snapshot file shows, see save_snapshot
+            'last_view_fingerprint': self.snapshot_fingerprint
         }
+        if not self.catalog_loaded:
+            # Nothing is selected yet, keep what the last session was looking at
+            settings.update(self.last_settings)
         
         try:
             with open(self.settings_file, 'w') as f:
@@ -404,13 +1381,25 @@ class BrainStatsUI:
                 self.grid_color_var.set(settings['grid_color'])
             if 'line_color' in settings and settings['line_color'] in self.line_color_cb['values']:
                 self.line_color_var.set(settings['line_color'])
+            if 'machine_mode' in settings and settings['machine_mode'] in self.machine_mode_cb['values']:
+                self.machine_mode_var.set(settings['machine_mode'])
+            if 'metric' in settings and settings['metric'] in self.metric_cb['values']:
+                self.metric_var.set(settings['metric'])
+            if 'x_axis' in settings and settings['x_axis'] in self.x_axis_cb['values']:
+                self.x_axis_var.set(settings['x_axis'])
+            if 'smoothing' in settings:
+                self.smoothing_var.set(str(settings['smoothing']))
+            if settings.get('eta_target') is not None:
+                self.eta_target_var.set(str(settings['eta_target']))
                 
             # We'll handle study/type/tag selection after loading studies
             self.last_settings = {
                 'last_study': settings.get('last_study', ''),
                 'last_type': settings.get('last_type', ''),
-                'last_tag': settings.get('last_tag', '')
+                'last_tag': settings.get('last_tag', ''),
+                'last_machine': settings.get('last_machine', '')
             }
+            self.snapshot_fingerprint = settings.get('last_view_fingerprint')
             
             # Apply window layout settings after a short delay to ensure widgets are ready
             def apply_layout():
@@ -518,146 +1507,261 @@ class BrainStatsUI:
         self.save_plot_as_png(initialdir=new_folder_name)
                 
     def sanitize_filename(self, filename):
-        """Remove characters that are problematic in filenames"""
-        if not filename:
-            return "unnamed"
-            
-        # Replace slashes, backslashes and other problematic characters
-        invalid_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
-        result = filename
-        for char in invalid_chars:
-            result = result.replace(char, '_')
-            
-        return result
+        return sanitize_filename(filename)
         
     def format_tag_for_display(self, tag):
-        """Replace 'Brain' with 'PGC' in tag names for display"""
-        if tag:
-            return tag.replace("Brain", "PGC")
-        return tag
+        return format_tag_for_display(tag)
+
+    def plot_style(self):
+        """Current plot controls, in the same shape as the settings file"""
+        return {
+            'log_scale': self.log_scale_var.get(),
+            'show_dots': self.show_dots_var.get(),
+            'h_grid': self.hgrid_var.get(),
+            'v_grid': self.vgrid_var.get(),
+            'grid_color': self.grid_color_var.get(),
+            'line_color': self.line_color_var.get(),
+            'machine_mode': self.machine_mode_var.get(),
+            'metric': self.metric_var.get(),
+            'x_axis': self.x_axis_var.get(),
+            'smoothing': self.smoothing(),
+            'eta_target': self.eta_target(),
+        }
+
+    def smoothing(self):
+        try:
+            return max(1, int(self.smoothing_var.get()))
+        except ValueError:
+            return 1
+
+    def eta_target(self):
+        try:
+            return int(self.eta_target_var.get())
+        except ValueError:
+            return None
     
     def on_tag_listbox_select(self, event):
         """Handle tag listbox selection changes"""
         # This just tracks selections, actual plotting happens when the Plot button is clicked
-        selected_indices = self.tag_listbox.curselection()
-        if selected_indices and self.type_var.get() == 'scalar':
+        if self.tag_listbox.selected and self.type_var.get() == 'scalar':
             self.plot_button.config(state=tk.NORMAL)
+            self.show_series_stats()
         else:
             self.plot_button.config(state=tk.DISABLED)
+
+    @timed
+    def show_series_stats(self):
+        """Fill the stats table for the listbox selection, or the current tag if nothing is selected"""
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        study = self.study_var.get()
+        if not study:
+            return
+        display_tags = self.tag_listbox.selected_items() or [self.tag_var.get()]
+        keys = [(study, self.display_to_original.get(t, t)) for t in display_tags if t]
+        for tag, machine, count, last_step, last_value, min_value, argmin_step, max_value, argmax_step, mean, std in \
+                self.repo.series_stats(keys):
+            self.stats_tree.insert('', tk.END, values=(
+                self.format_tag_for_display(tag), machine, count,
+                f"{last_value:.4g} @{last_step}",
+                f"{min_value:.4g} @{argmin_step}",
+                f"{max_value:.4g} @{argmax_step}",
+                f"{mean:.4g}", f"{std:.4g}",
+            ))
     
+    @timed
     def plot_selected_tags(self):
         """Plot all selected tags from the listbox"""
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         self.hide_image_widgets()
+        self.hide_snapshot()
+        # Only single-tag views are snapshotted, they are what the settings restore
+        self.current_fingerprint = None
         # Remove previous matplotlib canvas if present
         if hasattr(self, 'scalar_canvas'):
             self.scalar_canvas.get_tk_widget().pack_forget()
+        self.live_lines = {}
+        self.live_redraw = False
         
         study = self.study_var.get()
         if not study:
             return
             
         # Get selected tags
-        selected_indices = self.tag_listbox.curselection()
-        if not selected_indices:
+        selected_display_tags = self.tag_listbox.selected_items()
+        if not selected_display_tags:
             return
-            
-        # Get display tags from listbox
-        selected_display_tags = [self.tag_listbox.get(i) for i in selected_indices]
         
         # Convert display tags to original tags for database queries
         selected_original_tags = [self.display_to_original.get(display_tag, display_tag) 
                                 for display_tag in selected_display_tags]
         
-        # Create plot
-        fig, ax = plt.subplots(figsize=(6,4))
-        
-        # Set up scale first
-        if getattr(self, 'log_scale_var', None) and self.log_scale_var.get():
-            ax.set_yscale('log')
-            ax.yaxis.set_minor_locator(LogLocator(subs=range(2, 10)))
-        else:
-            ax.yaxis.set_minor_locator(AutoMinorLocator(4))
-            
-        # Add minor x-axis ticks for denser grid
-        ax.xaxis.set_minor_locator(AutoMinorLocator(4))
-        
-        # Apply grid settings
-        grid_color = self.grid_color_var.get()
-        
-        # Horizontal grid
-        if getattr(self, 'hgrid_var', None) and self.hgrid_var.get():
-            ax.yaxis.grid(True, which='major', linestyle='-', alpha=0.5, color=grid_color)
-            ax.yaxis.grid(True, which='minor', linestyle=':', alpha=0.3, color=grid_color)
-        else:
-            ax.yaxis.grid(False)
-        
-        # Vertical grid
-        if getattr(self, 'vgrid_var', None) and self.vgrid_var.get():
-            ax.xaxis.grid(True, which='major', linestyle='-', alpha=0.5, color=grid_color)
-            ax.xaxis.grid(True, which='minor', linestyle=':', alpha=0.3, color=grid_color)
-        else:
-            ax.xaxis.grid(False)
-        
-        # Get base color
-        base_color_idx = self.color_palette.index(self.line_color_var.get()) if self.line_color_var.get() in self.color_palette else 0
-        
-        # Plot each selected tag
-        for i, tag_pair in enumerate(zip(selected_display_tags, selected_original_tags)):
-            display_tag, original_tag = tag_pair
-            
-            # Get data for this tag
-            rows = self.con.execute("SELECT step, value FROM scalars WHERE study=? AND tag=? ORDER BY step", [study, original_tag]).fetchall()
-            if not rows:
-                continue
-                
-            # Get color for this line (cycling through palette)
-            color_idx = (base_color_idx + i) % len(self.color_palette)
-            line_color = self.color_palette[color_idx]
-            
-            # Plot the data
-            steps, values = zip(*rows)
-            if self.show_dots_var.get():
-                ax.plot(steps, values, marker='o', color=line_color, label=display_tag)
-            else:
-                ax.plot(steps, values, color=line_color, label=display_tag)
-        
-        # Set title and labels
-        ax.set_title(f"Multiple Tags ({study})")
-        ax.set_xlabel("Step")
-        ax.set_ylabel("Value")
+        style = self.plot_style()
+        with self.perf.phase('query'):
+            data = self.repo.plot_data(study, selected_original_tags, style['machine_mode'], **series_options(style))
         
-        # Add legend
-        ax.legend()
-        
-        fig.tight_layout()
-        self.scalar_canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
-        self.scalar_canvas.draw()
-        canvas_widget = self.scalar_canvas.get_tk_widget()
-        canvas_widget.pack(fill=tk.BOTH, expand=True)
+        # Create plot
+        with self.perf.phase('draw'):
+            fig, ax = plt.subplots(figsize=(6,4))
+            live_lines = draw_multi_tag_plot(ax, self.repo.con, study, list(zip(selected_display_tags, selected_original_tags)),
+                                             style, data=data)
+            fig.tight_layout()
+        with self.perf.phase('render'):
+            self.scalar_canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
+            self.scalar_canvas.draw()
+            canvas_widget = self.scalar_canvas.get_tk_widget()
+            canvas_widget.pack(fill=tk.BOTH, expand=True)
         
         # Store the figure for saving
         self.current_figure = fig
         self.current_tag = "multiple_tags"
         self.current_study = study
+        self.live_lines = live_lines
+        self.live_redraw = redraws_live(style)
         
         # Add right-click menu for saving
         canvas_widget.bind("<Button-3>", self.show_plot_context_menu)
         plt.close(fig)
     
+    def show_leaderboard(self):
+        LeaderboardPanel(self)
+
+    def toggle_perf_panel(self):
+        if self.perf_panel:
+            self.perf_panel.close()
+        else:
+            self.perf_panel = PerfPanel(self)
+
+    def open_plot(self, study, display_tag):
+        """Switch the main view to a scalar plot of display_tag in study"""
+        if study not in self.study_index:
+            return
+        self.study_var.set(study)
+        self.type_var.set('scalar')
+        self.load_tags(study, 'scalar')
+        if display_tag in self.display_to_original:
+            self.tag_var.set(display_tag)
+            self.on_tag_selected()
+
+    def release_if_live(self):
+        """With Live on an importer is expected to write: an open read-only connection,
+        even an idle one, keeps it from opening the file, so close it after every query"""
+        if self.live_var.get():
+            self.repo.release()
+
+    def on_live_toggle(self):
+        if self.live_var.get() and self.snapshot_label is not None:
+            # Live mode extends real lines, not a picture of them
+            self.show_scalar_plot()
+        if self.live_after_id:
+            self.root.after_cancel(self.live_after_id)
+            self.live_after_id = None
+        if self.live_var.get():
+            self.live_interval = LIVE_MIN_INTERVAL_MS
+            self.live_watermark = None
+            self.poll_live_updates()
+
+    def poll_live_updates(self):
+        """Append rows newer than the last plotted step, backing off while nothing changes"""
+        import duckdb
+        self.live_after_id = None
+        if not self.live_var.get():
+            return
+        changed = False
+        watermark = self.repo.watermark()
+        # Image views keep the last plot's state around, only redraw while a plot is shown
+        redraw = self.live_redraw and self.type_var.get() == 'scalar'
+        # Do not sit on the file between polls, the importer needs the write lock. Release
+        # every time, not only when the watermark moved: a connection some other view
+        # opened keeps the importer out, and then the watermark never moves
+        self.repo.release()
+        if (self.live_lines or redraw) and watermark != self.live_watermark:
+            try:
+                # A fresh connection sees everything the importer has committed
+                changed = self.append_live_points()
+                self.live_watermark = watermark
+            except duckdb.IOException as e:
+                print(f"Live refresh skipped, database busy: {e}")
+            finally:
+                self.repo.release()
+        if changed:
+            self.live_interval = LIVE_MIN_INTERVAL_MS
+        else:
+            self.live_interval = min(self.live_interval * 2, LIVE_MAX_INTERVAL_MS)
+        self.live_after_id = self.root.after(self.live_interval, self.poll_live_updates)
+
+    @timed
+    def append_live_points(self):
+        """Fetch only the new rows of every plotted line and extend the lines in place"""
+        import numpy as np
+        if self.live_redraw:
+            if self.current_tag == "multiple_tags":
+                self.plot_selected_tags()
+            else:
+                self.show_scalar_plot()
+            return True
+        style = self.plot_style()
+        # Per-machine lines are keyed (study, tag, machine), ask for anything past
+        # the oldest of their last steps and trim per line below
+        after_steps = {}
+        for key, line in self.live_lines.items():
+            xdata = line.get_xdata()
+            last = int(xdata[-1]) if len(xdata) else None
+            series_key = key[:2]
+            if last is None or after_steps.get(series_key, last) is None:
+                after_steps[series_key] = None
+            else:
+                after_steps[series_key] = min(last, after_steps.get(series_key, last))
+        by_machine = any(len(key) == 3 for key in self.live_lines)
+        new_points = self.repo.series_batch(list(after_steps), after_steps, by_machine=by_machine,
+                                            source=scalar_source(**series_options(style)))
+        changed = False
+        for key, (steps, values) in new_points.items():
+            line = self.live_lines.get(key)
+            if line is None:
+                continue  # a machine that was not on the plot yet
+            xdata = line.get_xdata()
+            if len(xdata):
+                newer = steps > xdata[-1]
+                steps, values = steps[newer], values[newer]
+            if not len(steps):
+                continue
+            line.set_data(np.concatenate((xdata, steps)),
+                          np.concatenate((line.get_ydata(), values)))
+            changed = True
+        if not changed:
+            return False
+        ax = next(iter(self.live_lines.values())).axes
+        ax.relim()
+        ax.autoscale_view()
+        self.scalar_canvas.draw_idle()
+        return True
+
     def on_close(self):
         """Save settings when closing the app"""
         # Cancel any pending save
         if self.save_timer_id:
             self.root.after_cancel(self.save_timer_id)
         # Save immediately
+        self.save_snapshot()
         self.save_settings()
+        self.decode_pool.shutdown(wait=False, cancel_futures=True)
+        self.background_pool.shutdown(wait=False, cancel_futures=True)
+        self.perf.stop_trace()
+        if self.live_after_id:
+            self.root.after_cancel(self.live_after_id)
         self.root.destroy()
 
+    @timed
     def show_scalar_plot(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         self.hide_image_widgets()
         # Remove previous matplotlib canvas if present
         if hasattr(self, 'scalar_canvas'):
             self.scalar_canvas.get_tk_widget().pack_forget()
+        self.live_lines = {}
+        self.live_redraw = False
         
         study = self.study_var.get()
         display_tag = self.tag_var.get()
@@ -667,70 +1771,120 @@ class BrainStatsUI:
         # Convert display tag back to original tag for database query
         original_tag = self.display_to_original.get(display_tag, display_tag)
         
-        rows = self.con.execute("SELECT step, value FROM scalars WHERE study=? AND tag=? ORDER BY step", [study, original_tag]).fetchall()
-        if not rows:
+        style = self.plot_style()
+        key = plot_key(study, original_tag, style)
+        prefetched, self.prefetched_plot = self.prefetched_plot, None
+        if prefetched and prefetched[0] == key and prefetched[1] is None and self.snapshot_label is not None:
+            # Nothing changed since the snapshot on screen was taken, it stays until clicked
             return
-        steps, values = zip(*rows)
-        fig, ax = plt.subplots(figsize=(6,4))
-        line_color = self.line_color_var.get()
-        if self.show_dots_var.get():
-            ax.plot(steps, values, marker='o', color=line_color, label=display_tag)
+        self.hide_snapshot()
+        self.current_fingerprint = None
+        if prefetched and prefetched[0] == key and prefetched[1] is not None:
+            data, fingerprint = prefetched[1], prefetched[2]
+            self.perf.note(prefetched=True)
         else:
-            ax.plot(steps, values, color=line_color, label=display_tag)
-        ax.set_title(f"{display_tag} ({study})")
-        ax.set_xlabel("Step")
-        ax.set_ylabel("Value")
-        # First set scale, which affects grid behavior
-        if getattr(self, 'log_scale_var', None) and self.log_scale_var.get():
-            ax.set_yscale('log')
-            # Also add more ticks for denser grid in log mode
-            ax.yaxis.set_minor_locator(LogLocator(subs=range(2, 10)))
-        else:
-            # Add more y-axis ticks for denser grid in linear mode
-            ax.yaxis.set_minor_locator(AutoMinorLocator(4))
-            
-        # Add minor x-axis ticks for denser grid
-        ax.xaxis.set_minor_locator(AutoMinorLocator(4))
-        
-        # Apply grid settings
-        grid_color = self.grid_color_var.get()
-        
-        # Horizontal grid
-        if getattr(self, 'hgrid_var', None) and self.hgrid_var.get():
-            # Major grid lines
-            ax.yaxis.grid(True, which='major', linestyle='-', alpha=0.5, color=grid_color)
-            # Minor grid lines
-            ax.yaxis.grid(True, which='minor', linestyle=':', alpha=0.3, color=grid_color)
-        else:
-            ax.yaxis.grid(False)
-        
-        # Vertical grid
-        if getattr(self, 'vgrid_var', None) and self.vgrid_var.get():
-            # Major grid lines
-            ax.xaxis.grid(True, which='major', linestyle='-', alpha=0.5, color=grid_color)
-            # Minor grid lines
-            ax.xaxis.grid(True, which='minor', linestyle=':', alpha=0.3, color=grid_color)
-        else:
-            ax.xaxis.grid(False)
-            
-        # Add legend if needed
-        ax.legend()
-            
-        fig.tight_layout()
-        self.scalar_canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
-        self.scalar_canvas.draw()
-        canvas_widget = self.scalar_canvas.get_tk_widget()
-        canvas_widget.pack(fill=tk.BOTH, expand=True)
+            # Fingerprint before data: should rows arrive in between it is older than the plot, never newer
+            with self.perf.phase('fingerprint'):
+                fingerprint = self.repo.fingerprint(study, original_tag, style)
+            with self.perf.phase('query'):
+                data = self.repo.plot_data(study, [original_tag], style['machine_mode'], **series_options(style))
+        if not data:
+            return
+        with self.perf.phase('draw'):
+            fig, ax = plt.subplots(figsize=(6,4))
+            line_color = style['line_color']
+            colors = [line_color] + [c for c in self.color_palette if c != line_color]
+            live_lines = draw_plot_data(ax, data, study, [(display_tag, original_tag)], colors,
+                                        style['machine_mode'], style['show_dots'],
+                                        wall_clock=style['x_axis'] == X_WALL_TIME)
+            ax.set_title(f"{display_tag} ({study})")
+            label_axes(ax, style)
+            style_axes(ax, style)
+                
+            # Add legend if needed
+            ax.legend()
+                
+            fig.tight_layout()
+        with self.perf.phase('render'):
+            self.scalar_canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
+            self.scalar_canvas.draw()
+            canvas_widget = self.scalar_canvas.get_tk_widget()
+            canvas_widget.pack(fill=tk.BOTH, expand=True)
         
         # Store the figure for saving
         self.current_figure = fig
         self.current_tag = display_tag
         self.current_study = study
+        self.current_fingerprint = fingerprint
+        self.live_lines = live_lines
+        self.live_redraw = redraws_live(style)
         
         # Add right-click menu for saving
         canvas_widget.bind("<Button-3>", self.show_plot_context_menu)
         plt.close(fig)
 
+    @timed
+    def show_histogram_heatmap(self):
+        """Steps x values heatmap of a histogram tag, log scale colours by density instead"""
+        import numpy as np
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.colors import LogNorm
+        self.hide_image_widgets()
+        self.hide_snapshot()
+        if hasattr(self, 'scalar_canvas'):
+            self.scalar_canvas.get_tk_widget().pack_forget()
+        self.live_lines = {}
+        self.live_redraw = False
+        self.current_fingerprint = None
+
+        study = self.study_var.get()
+        display_tag = self.tag_var.get()
+        if not study or not display_tag:
+            return
+        original_tag = self.display_to_original.get(display_tag, display_tag)
+
+        style = self.plot_style()
+        with self.perf.phase('query'):
+            grid = self.repo.histogram_grid(study, original_tag)
+        if grid is None:
+            return
+        self.perf.note(steps=len(grid['step']))
+        with self.perf.phase('draw'):
+            fig, ax = plt.subplots(figsize=(6,4))
+            # Each step's column reaches halfway to its neighbours
+            steps = grid['step'].astype(float)
+            if len(steps) > 1:
+                mids = (steps[1:] + steps[:-1]) / 2
+                step_edges = np.concatenate([[2 * steps[0] - mids[0]], mids, [2 * steps[-1] - mids[-1]]])
+            else:
+                step_edges = np.array([steps[0] - 0.5, steps[0] + 0.5])
+            density = grid['density']
+            if style['log_scale']:
+                norm = LogNorm(vmin=max(density[density > 0].min(), 1e-6), vmax=density.max())
+                density = np.ma.masked_less_equal(density, 0)
+            else:
+                norm = None
+            mesh = ax.pcolormesh(step_edges, grid['edges'], density, cmap='viridis', norm=norm, shading='flat')
+            fig.colorbar(mesh, ax=ax, label="Share of values")
+            ax.set_title(f"{display_tag} ({study})")
+            ax.set_xlabel("Step")
+            ax.set_ylabel("Value")
+            style_axes(ax, dict(style, log_scale=False))
+            fig.tight_layout()
+        with self.perf.phase('render'):
+            self.scalar_canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
+            self.scalar_canvas.draw()
+            canvas_widget = self.scalar_canvas.get_tk_widget()
+            canvas_widget.pack(fill=tk.BOTH, expand=True)
+
+        self.current_figure = fig
+        self.current_tag = display_tag
+        self.current_study = study
+        canvas_widget.bind("<Button-3>", self.show_plot_context_menu)
+        plt.close(fig)
+
+    @timed
     def load_images(self):
         study = self.study_var.get()
         display_tag = self.tag_var.get()
@@ -738,11 +1892,19 @@ class BrainStatsUI:
         # Convert display tag back to original tag for database query
         original_tag = self.display_to_original.get(display_tag, display_tag)
         
-        self.images = self.con.execute(
-            "SELECT step, wall_time, image_format, image_data FROM images WHERE study=? AND tag=? ORDER BY step", [study, original_tag]
-        ).fetchall()
+        with self.perf.phase('query'):
+            self.image_steps, self.images = self.repo.images(study, original_tag)
+        self.perf.note(frames=len(self.images))
         self.img_idx = 0
+        
+        # Frames still queued for the previous series are of no use any more
+        with self.pending_lock:
+            for future in self.pending_frames.values():
+                future.cancel()
+            self.pending_frames.clear()
+        self.image_series = (study, original_tag, len(self.images))
 
+    @timed
     def show_image(self):
         self.hide_scalar_widgets()
         # Only update widgets if they still exist (not destroyed by Tkinter)
@@ -767,12 +1929,12 @@ class BrainStatsUI:
             except tk.TclError:
                 pass
             return
-        step, wall_time, img_format, img_data = self.images[self.img_idx]
+        step = self.image_steps[self.img_idx]
         try:
-            img = Image.open(io.BytesIO(img_data))
-            # Use a much larger size to effectively fill the available space
-            img.thumbnail((1500, 1500))
-            img_tk = ImageTk.PhotoImage(img)
+            with self.perf.phase('frame'):
+                frame = self.get_frame(self.img_idx)
+            with self.perf.phase('photo'):
+                img_tk = to_photo_image(frame)
             self.image_label.config(image=img_tk, text="")
             self.image_label.image = img_tk
         except Exception as e:
@@ -793,20 +1955,168 @@ class BrainStatsUI:
             self.image_slider.set(self.img_idx)
         else:
             self.image_slider.config(state=tk.DISABLED, from_=0, to=0)
+        self.prefetch_frames(self.img_idx)
+
+    def frame_key(self, idx):
+        return (self.image_series, idx, self.display_size)
+
+    def get_frame(self, idx):
+        """Return the decoded frame for idx, from the cache if the prefetcher got there first"""
+        key = self.frame_key(idx)
+        frame = self.frame_cache.get(key)
+        if frame is not None:
+            self.perf.note(frame_source='cache')
+            return frame
+        with self.pending_lock:
+            future = self.pending_frames.get(key)
+            # A job still in the queue may sit behind the rest of the prefetch window,
+            # take it back and decode here; only wait for one that is already running
+            if future is not None and future.cancel():
+                self.pending_frames.pop(key, None)
+                future = None
+        if future is not None:
+            try:
+                frame = future.result()
+            except CancelledError:
+                frame = None
+            if frame is not None:
+                self.perf.note(frame_source='prefetch')
+                return frame
+        self.perf.note(frame_source='decode')
+        frame = decode_frame(self.images[idx], self.display_size)
+        self.frame_cache.put(key, frame)
+        return frame
+
+    def on_image_frame_configure(self, event):
+        """Re-render at the new size once the image area stops changing"""
+        if self.resize_after_id:
+            self.root.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.root.after(RESIZE_DEBOUNCE_MS, self.update_display_size)
+
+    def update_display_size(self):
+        self.resize_after_id = None
+        size = self.measure_display_size()
+        if size == self.display_size:
+            return
+        self.display_size = size
+        if self.images and self.type_var.get() == 'image':
+            self.show_image()
+
+    def measure_display_size(self):
+        """Space left for the picture once the labels, buttons and slider are laid out"""
+        width = self.image_frame.winfo_width()
+        height = self.image_frame.winfo_height()
+        for widget in (self.sample_id_label, self.image_nav_frame, self.image_slider):
+            height -= widget.winfo_reqheight()
+        if width <= 1 or height <= 1:
+            return THUMBNAIL_SIZE
+        return (width, height)
+
+    def prefetch_frames(self, center):
+        """Queue background decoding of the frames around center, nearest first"""
+        offsets = []
+        for distance in range(1, max(PREFETCH_AHEAD, PREFETCH_BEHIND) + 1):
+            if distance <= PREFETCH_AHEAD:
+                offsets.append(distance)
+            if distance <= PREFETCH_BEHIND:
+                offsets.append(-distance)
+        for offset in offsets:
+            idx = center + offset
+            if not 0 <= idx < len(self.images):
+                continue
+            key = self.frame_key(idx)
+            if key in self.frame_cache:
+                continue
+            with self.pending_lock:
+                if key in self.pending_frames:
+                    continue
+                self.pending_frames[key] = self.decode_pool.submit(self.decode_frame_job, key, self.images[idx])
+
+    def decode_frame_job(self, key, img_data):
+        """Runs on the decoder pool; skips frames the user has already scrolled away from"""
+        series, idx, size = key
+        try:
+            if series != self.image_series or not (
+                    self.img_idx - PREFETCH_BEHIND <= idx <= self.img_idx + PREFETCH_AHEAD):
+                return None
+            frame = self.frame_cache.get(key)
+            if frame is None:
+                with self.perf.operation('decode_frame', idx=idx):
+                    frame = decode_frame(img_data, size)
+                self.frame_cache.put(key, frame)
+            return frame
+        except Exception as e:
+            print(f"Could not prefetch frame {idx}: {e}")
+            return None
+        finally:
+            with self.pending_lock:
+                self.pending_frames.pop(key, None)
+
+    def on_sheet_toggle(self):
+        if self.sheet_var.get():
+            self.show_contact_sheet()
+        else:
+            self.contact_sheet.frame.grid_remove()
+            self.sheet_stride_sb.config(state=tk.DISABLED)
+            self.image_label.grid()
+            self.load_images()
+            self.show_image()
+
+    @timed
+    def show_contact_sheet(self):
+        """Replace the single image with the grid, without loading every blob of the tag"""
+        study = self.study_var.get()
+        display_tag = self.tag_var.get()
+        if not study or not display_tag:
+            return
+        self.images = []
+        self.image_label.grid_remove()
+        self.contact_sheet.frame.grid(row=0, column=0, sticky='nsew')
+        self.image_nav_frame.grid()
+        self.prev_btn.config(state=tk.NORMAL)
+        self.next_btn.config(state=tk.NORMAL)
+        self.image_slider.config(state=tk.DISABLED)
+        self.contact_sheet.load(study, self.display_to_original.get(display_tag, display_tag))
+        self.sheet_stride_sb.config(state=tk.NORMAL, to=self.contact_sheet.overview_stride())
+        self.sheet_stride_var.set(str(self.contact_sheet.stride))
+
+    def on_sheet_stride_change(self, event=None):
+        try:
+            stride = int(self.sheet_stride_var.get())
+        except ValueError:
+            stride = self.contact_sheet.stride
+        self.contact_sheet.set_stride(stride)
+        self.sheet_stride_var.set(str(self.contact_sheet.stride))
 
     def prev_image(self):
+        if self.sheet_var.get():
+            self.contact_sheet.scroll(-self.contact_sheet.rows)
+            return
         if self.img_idx > 0:
             self.img_idx -= 1
             self.show_image()
 
     def next_image(self):
+        if self.sheet_var.get():
+            self.contact_sheet.scroll(self.contact_sheet.rows)
+            return
         if self.img_idx < len(self.images)-1:
             self.img_idx += 1
             self.show_image()
 
     def on_slider_move(self, value):
+        """Merge slider ticks that arrive faster than frames can be shown, only the latest is drawn"""
         idx = int(float(value))
-        if idx != self.img_idx and 0 <= idx < len(self.images):
+        if not 0 <= idx < len(self.images):
+            return
+        self.slider_target = idx
+        if self.slider_after_id is None and idx != self.img_idx:
+            self.slider_after_id = self.root.after(SLIDER_COALESCE_MS, self.flush_slider_move)
+
+    def flush_slider_move(self):
+        self.slider_after_id = None
+        idx = self.slider_target
+        if idx is not None and idx != self.img_idx and 0 <= idx < len(self.images):
             self.img_idx = idx
             self.show_image()
 
@@ -814,11 +2124,52 @@ class BrainStatsUI:
         self.image_label.pack_forget()
         self.image_nav_frame.pack_forget()
     def hide_scalar_widgets(self):
-        pass  # For future extension
+        self.hide_snapshot()
+
+    def show_snapshot(self):
+        """Show the picture of last session's plot while the database loads"""
+        if self.last_settings['last_type'] != 'scalar' or not self.snapshot_fingerprint:
+            return
+        if not os.path.exists(self.snapshot_file):
+            return
+        try:
+            photo = tk.PhotoImage(file=self.snapshot_file)
+        except tk.TclError as e:
+            print(f"Could not read snapshot: {e}")
+            return
+        self.snapshot_label = ttk.Label(self.plot_frame, image=photo, anchor=tk.CENTER, cursor='hand2')
+        self.snapshot_label.image = photo
+        self.snapshot_label.pack(fill=tk.BOTH, expand=True)
+        # A click swaps in the interactive plot
+        self.snapshot_label.bind('<Button-1>', lambda e: self.show_scalar_plot())
+
+    def hide_snapshot(self):
+        if self.snapshot_label is not None:
+            self.snapshot_label.destroy()
+            self.snapshot_label = None
+
+    def save_snapshot(self):
+        """Write the plot on screen next to the settings file for show_snapshot"""
+        if self.snapshot_label is not None:
+            return  # still showing the old snapshot, which is current
+        if self.current_fingerprint is None or self.type_var.get() != 'scalar':
+            self.snapshot_fingerprint = None
+            return
+        try:
+            self.current_figure.savefig(self.snapshot_file, dpi=self.current_figure.dpi)
+            self.snapshot_fingerprint = self.current_fingerprint
+        except Exception as e:
+            print(f"Could not save snapshot: {e}")
+            self.snapshot_fingerprint = None
 
 def main():
+    parser = argparse.ArgumentParser(description='PGC stats viewer')
+    parser.add_argument('--trace', help='Append the timing of every data and render operation to this JSONL file')
+    parser.add_argument('--db', nargs='+', default=[DB_PATH],
+                        help='DuckDB files, Parquet datasets or folders holding them, read as one database')
+    args = parser.parse_args()
     root = tk.Tk()
-    app = BrainStatsUI(root)
+    app = BrainStatsUI(root, trace_path=args.trace, db_sources=args.db)
     root.mainloop()
 
 if __name__ == '__main__':
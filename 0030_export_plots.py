@@ -0,0 +1,109 @@
+# render the viewer's "Plot Selected" figures headlessly, many studies in parallel
+import argparse
+import datetime
+import fnmatch
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import duckdb
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from tqdm import tqdm
+
+# Styling, queries and file naming are the viewer's own so exports match what it saves
+from brain_stats_repository import DB_PATH
+from brain_stats_plotting import DEFAULT_PLOT_STYLE, draw_multi_tag_plot, format_tag_for_display, sanitize_filename
+
+SETTINGS_FILE = 'brain_stats_settings.json'
+
+# Each worker process keeps its own read-only connection
+worker_con = None
+
+
+def load_plot_style(settings_file):
+    """Plot settings saved by the viewer, defaults for anything missing"""
+    style = dict(DEFAULT_PLOT_STYLE)
+    if os.path.exists(settings_file):
+        with open(settings_file, 'r') as f:
+            settings = json.load(f)
+        style.update({key: settings[key] for key in style if key in settings})
+    return style
+
+
+def matches(name, patterns):
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def resolve_jobs(con, study_patterns, tag_patterns):
+    """List (study, tags) for every study matching study_patterns, keeping the tags that match tag_patterns"""
+    rows = con.execute("SELECT DISTINCT study, tag FROM scalars ORDER BY study, tag").fetchall()
+    jobs = {}
+    for study, tag in rows:
+        if matches(study, study_patterns) and matches(tag, tag_patterns):
+            jobs.setdefault(study, []).append(tag)
+    return list(jobs.items())
+
+
+def init_worker(db_path):
+    global worker_con
+    worker_con = duckdb.connect(db_path, read_only=True)
+
+
+def render_study(study, tags, style, out_dir, fmt, dpi):
+    """Draw one study's tags into a file named like the viewer's right-click save"""
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    tag_pairs = [(format_tag_for_display(tag), tag) for tag in tags]
+    draw_multi_tag_plot(ax, worker_con, study, tag_pairs, style)
+    fig.tight_layout()
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{sanitize_filename(study)}_multiple_tags_{timestamp}.{fmt}"
+    path = os.path.join(out_dir, filename)
+    fig.savefig(path, dpi=dpi, bbox_inches='tight', format=fmt)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export multi-tag scalar plots for many studies without the UI')
+    parser.add_argument('--studies', nargs='+', required=True,
+                        help='Study names or glob patterns, e.g. "674gs_pgc_fit.py_202505*"')
+    parser.add_argument('--tags', nargs='+', required=True,
+                        help='Tag names or glob patterns, e.g. "Batch/*"')
+    parser.add_argument('--out-dir', default='.', help='Directory for the rendered files')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png', help='Output format')
+    parser.add_argument('--dpi', type=int, default=300, help='Resolution for PNG output (default: 300, as the viewer)')
+    parser.add_argument('--db', default=DB_PATH, help='DuckDB file to read')
+    parser.add_argument('--settings', default=SETTINGS_FILE,
+                        help='Viewer settings file to take the plot style from')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    args = parser.parse_args()
+
+    con = duckdb.connect(args.db, read_only=True)
+    jobs = resolve_jobs(con, args.studies, args.tags)
+    con.close()
+    if not jobs:
+        print("No studies with matching tags found")
+        return
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    style = load_plot_style(args.settings)
+
+    # spawn, not fork: the parent has already run DuckDB's thread pool
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                             initializer=init_worker, initargs=(args.db,)) as pool:
+        futures = {pool.submit(render_study, study, tags, style, args.out_dir, args.format, args.dpi): study
+                   for study, tags in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Exporting plots"):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Could not export {futures[future]}: {e}")
+
+    print(f"Done. {len(jobs)} plots written to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
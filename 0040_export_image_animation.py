@@ -0,0 +1,225 @@
+# turn one (study, tag) image series into an animated GIF/WebP, or an MP4 through ffmpeg
+# frames are streamed out of DuckDB in step order and written as they are decoded,
+# so memory stays flat however long the run is, except for WebP, see WEBP_MAX_FRAMES
+import argparse
+import io
+import os
+import shutil
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import duckdb
+from PIL import Image, GifImagePlugin
+from tqdm import tqdm
+from brain_stats_repository import DB_PATH, fetch_image_steps
+# File naming is the viewer's so exports sit next to its own saves
+from brain_stats_plotting import sanitize_filename
+
+# Steps whose blobs are read per query, and decoded frames allowed in flight
+FETCH_CHUNK = 32
+DECODE_QUEUE = 16
+# Blocks DuckDB has read stay in its buffer pool until it hits this, cap it so the
+# pool does not grow with the length of the series
+DUCKDB_MEMORY_LIMIT = '128MB'
+# libwebp's animation encoder keeps every frame until the file is assembled, so
+# WebP memory grows with the number of frames; longer series are refused
+WEBP_MAX_FRAMES = 1000
+
+
+def stream_images(con, study, tag, steps):
+    """Yield (step, image_data) in step order, one machine per step, FETCH_CHUNK steps per query"""
+    for start in range(0, len(steps), FETCH_CHUNK):
+        chunk = steps[start:start + FETCH_CHUNK]
+        rows = con.execute(
+            """SELECT step, image_data FROM images
+               WHERE study=? AND tag=? AND step BETWEEN ? AND ?
+               ORDER BY step, machine""",
+            [study, tag, int(chunk[0]), int(chunk[-1])]
+        ).fetchall()
+        last_step = None
+        for step, img_data in rows:
+            if step != last_step:
+                last_step = step
+                yield step, img_data
+
+
+def frame_size(img_data, max_size, even):
+    """Canvas size for the animation, taken from the first frame"""
+    with Image.open(io.BytesIO(img_data)) as img:
+        width, height = img.size
+    if max_size:
+        scale = min(1.0, max_size / max(width, height))
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    if even:
+        # yuv420p wants even dimensions
+        width, height = max(2, width - width % 2), max(2, height - height % 2)
+    return width, height
+
+
+def decode(img_data, size):
+    """Decode one blob to an RGB frame of exactly size"""
+    img = Image.open(io.BytesIO(img_data))
+    img.draft('RGB', size)
+    img = img.convert('RGB')
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+class GifWriter:
+    """Write GIF frames as they arrive instead of collecting them for Image.save"""
+
+    def __init__(self, path, size, fps, loop):
+        self.f = open(path, 'wb')
+        self.duration = round(1000 / fps)
+        self.loop = loop
+        self.started = False
+
+    def add(self, frame):
+        frame = frame.quantize(256)
+        if not self.started:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': self.duration})
+            self.f.write(b''.join(header))
+            self.started = True
+        # every frame gets its own palette, the global one only fits the first
+        for chunk in GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True):
+            self.f.write(chunk)
+
+    def close(self):
+        self.f.write(b';')
+        self.f.close()
+
+
+class WebPWriter:
+    """Feed frames into libwebp's animation encoder, which holds them all until close"""
+
+    def __init__(self, path, size, fps, loop, quality=80):
+        # Pillow's private encoder module, only needed for WebP
+        from PIL import _webp
+        self.path = path
+        self.duration = 1000 / fps
+        self.quality = quality
+        self.timestamp = 0
+        # background, loop, minimize_size, kmin, kmax, allow_mixed, verbose, as Pillow's own _save_all
+        self.enc = _webp.WebPAnimEncoder(size, 0, loop, False, 3, 5, False, False)
+
+    def add(self, frame):
+        self.enc.add(frame.getim(), round(self.timestamp), False, self.quality, 100, 0)
+        self.timestamp += self.duration
+
+    def close(self):
+        self.enc.add(None, round(self.timestamp), False, self.quality, 100, 0)
+        data = self.enc.assemble('', '', '')
+        if data is None:
+            raise OSError("WebP encoder returned no data")
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+
+class FfmpegWriter:
+    """Pipe raw RGB frames into an ffmpeg process encoding H.264"""
+
+    def __init__(self, path, size, fps, ffmpeg, crf=20):
+        width, height = size
+        self.proc = subprocess.Popen(
+            [ffmpeg, '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+             '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', str(crf), path],
+            stdin=subprocess.PIPE
+        )
+
+    def add(self, frame):
+        self.proc.stdin.write(frame.tobytes())
+
+    def close(self):
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise OSError(f"ffmpeg exited with code {self.proc.returncode}")
+
+
+def export_animation(con, study, tag, path, fmt, fps, max_size=None, loop=0, workers=4, ffmpeg=None,
+                     webp_max_frames=WEBP_MAX_FRAMES):
+    """Stream a tag's images into path, returns the number of frames written"""
+    steps = fetch_image_steps(con, study, tag)
+    if len(steps) == 0:
+        return 0
+    if fmt == 'webp' and len(steps) > webp_max_frames:
+        raise ValueError(f"{len(steps)} frames is more than the {webp_max_frames} a WebP is built from in memory, "
+                         "use gif or mp4 or raise --webp-max-frames")
+    images = stream_images(con, study, tag, steps)
+    first_step, first_data = next(images)
+    size = frame_size(first_data, max_size, even=(fmt == 'mp4'))
+
+    if fmt == 'gif':
+        writer = GifWriter(path, size, fps, loop)
+    elif fmt == 'webp':
+        writer = WebPWriter(path, size, fps, loop)
+    else:
+        writer = FfmpegWriter(path, size, fps, ffmpeg)
+
+    # Decoding runs ahead of the writer by at most DECODE_QUEUE frames
+    written = 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool, tqdm(total=len(steps), desc="Writing frames") as progress:
+        try:
+            pending.append(pool.submit(decode, first_data, size))
+            del first_data
+            for step, img_data in images:
+                pending.append(pool.submit(decode, img_data, size))
+                if len(pending) >= DECODE_QUEUE:
+                    writer.add(pending.popleft().result())
+                    written += 1
+                    progress.update()
+            while pending:
+                writer.add(pending.popleft().result())
+                written += 1
+                progress.update()
+        finally:
+            for future in pending:
+                future.cancel()
+            writer.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export an image tag as an animation')
+    parser.add_argument('--study', required=True, help='Study name')
+    parser.add_argument('--tag', required=True, help='Image tag, e.g. "Brain/Viz"')
+    parser.add_argument('--format', choices=['gif', 'webp', 'mp4'],
+                        help='Output format (default: mp4 when ffmpeg is found, gif otherwise). mp4 needs ffmpeg; '
+                             'webp keeps every frame in memory until the end, see --webp-max-frames')
+    parser.add_argument('--out', help='Output file (default: <study>_<tag>.<format> in the current folder)')
+    parser.add_argument('--fps', type=float, default=10, help='Frames per second (default: 10)')
+    parser.add_argument('--max-size', type=int, help='Scale frames down so the longer side is at most this')
+    parser.add_argument('--loop', type=int, default=0, help='GIF/WebP loop count, 0 loops forever')
+    parser.add_argument('--db', default=DB_PATH, help='DuckDB file to read')
+    parser.add_argument('--ffmpeg', default=shutil.which('ffmpeg'), help='ffmpeg binary for MP4 output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Decoder threads')
+    parser.add_argument('--webp-max-frames', type=int, default=WEBP_MAX_FRAMES,
+                        help=f'Refuse WebP exports longer than this, memory grows with every frame '
+                             f'(default: {WEBP_MAX_FRAMES})')
+    args = parser.parse_args()
+
+    if args.format is None:
+        args.format = 'mp4' if args.ffmpeg else 'gif'
+    if args.format == 'mp4' and not args.ffmpeg:
+        parser.error("MP4 export needs ffmpeg on the PATH or --ffmpeg")
+    out = args.out or f"{sanitize_filename(args.study)}_{sanitize_filename(args.tag)}.{args.format}"
+
+    con = duckdb.connect(args.db, read_only=True, config={'memory_limit': DUCKDB_MEMORY_LIMIT})
+    try:
+        written = export_animation(con, args.study, args.tag, out, args.format, args.fps,
+                                   max_size=args.max_size, loop=args.loop, workers=args.workers, ffmpeg=args.ffmpeg,
+                                   webp_max_frames=args.webp_max_frames)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        con.close()
+    if written:
+        print(f"Done. {written} frames written to {out}")
+    else:
+        print(f"No images found for {args.study} / {args.tag}")
+
+
+if __name__ == '__main__':
+    main()
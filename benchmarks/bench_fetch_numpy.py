@@ -0,0 +1,91 @@
+# compare the two ways the viewer can move a scalar series from DuckDB into matplotlib:
+#   rows  - fetchall() -> zip(*rows) -> ax.plot   (what the viewer used to do)
+#   numpy - fetchnumpy() -> ax.plot                (contiguous int64/float64 buffers)
+import argparse
+import time
+import duckdb
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+
+QUERY = "SELECT step, value FROM scalars WHERE study=? AND tag=? ORDER BY step"
+
+
+def create_series(con, n_points):
+    """Create a scalars table holding one series of n_points rows"""
+    con.execute("DROP TABLE IF EXISTS scalars")
+    con.execute(f"""
+    CREATE TABLE scalars AS
+    SELECT 'bench_study' AS study,
+           'Batch/Accuracy' AS tag,
+           i::BIGINT AS step,
+           i * 0.01 AS wall_time,
+           random() AS value,
+           'bench' AS machine
+    FROM range({n_points}) t(i)
+    """)
+
+
+def rows_path(con):
+    timings = {}
+    t0 = time.perf_counter()
+    rows = con.execute(QUERY, ['bench_study', 'Batch/Accuracy']).fetchall()
+    timings['fetch'] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    steps, values = zip(*rows)
+    timings['convert'] = time.perf_counter() - t0
+    timings['plot'] = plot(steps, values)
+    return timings
+
+
+def numpy_path(con):
+    timings = {}
+    t0 = time.perf_counter()
+    result = con.execute(QUERY, ['bench_study', 'Batch/Accuracy']).fetchnumpy()
+    timings['fetch'] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    steps = np.asarray(result['step'], dtype=np.int64)
+    values = np.asarray(result['value'], dtype=np.float64)
+    timings['convert'] = time.perf_counter() - t0
+    timings['plot'] = plot(steps, values)
+    return timings
+
+
+def plot(steps, values):
+    """Time handing the data to matplotlib (line creation, not rasterisation)"""
+    fig, ax = plt.subplots(figsize=(6, 4))
+    t0 = time.perf_counter()
+    ax.plot(steps, values)
+    ax.relim()
+    ax.autoscale_view()
+    elapsed = time.perf_counter() - t0
+    plt.close(fig)
+    return elapsed
+
+
+def best_of(func, con, repeat):
+    runs = [func(con) for _ in range(repeat)]
+    return min(runs, key=lambda r: sum(r.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fetchall/zip against fetchnumpy for scalar series')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**6, 10**7],
+                        help='Number of points per series (default: 1e6 1e7)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per path, the fastest is reported')
+    args = parser.parse_args()
+
+    con = duckdb.connect()
+    print(f"{'points':>10}  {'path':<6} {'fetch':>8} {'convert':>8} {'plot':>8} {'total':>8}")
+    for n_points in args.sizes:
+        create_series(con, n_points)
+        for name, func in (('rows', rows_path), ('numpy', numpy_path)):
+            t = best_of(func, con, args.repeat)
+            total = sum(t.values())
+            print(f"{n_points:>10}  {name:<6} {t['fetch']:>7.3f}s {t['convert']:>7.3f}s {t['plot']:>7.3f}s {total:>7.3f}s")
+
+
+if __name__ == '__main__':
+    main()
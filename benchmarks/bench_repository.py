@@ -0,0 +1,162 @@
+# time every query of brain_stats_repository against a generated database, no UI involved
+# the database is built once (default 1e8 scalar rows, 1e5 images and 1e5 histograms, several GB and a few
+# minutes) and reused on later runs, each operation is then repeated and p50/p99 reported
+#   python benchmarks/bench_repository.py --scalars 1000000 --images 1000 --db /tmp/small.duckdb
+import argparse
+import io
+import os
+import sys
+import time
+import duckdb
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from brain_stats_repository import (
+    BrainStatsRepository, MACHINE_MODE_COMBINED, MACHINE_MODE_SPLIT, MACHINE_MODE_BANDS,
+    REDUCER_LAST, REDUCER_MEAN_LAST_N, METRIC_STEPS_PER_SEC, METRIC_ETA, X_WALL_TIME,
+)
+
+STUDIES = 200
+SCALAR_TAGS = ['Batch/Accuracy', 'Batch/Loss', 'Brain/Cells', 'Brain/Energy', 'Epoch/Accuracy']
+IMAGE_TAGS = ['Brain/Viz', 'Brain/Weights']
+HISTOGRAM_TAGS = ['Brain/Activations']
+HISTOGRAM_BUCKETS = 30
+MACHINES = ['zen', 'xen', 'ryzen', 'epyc']
+
+
+def png_blob(size):
+    """One noisy PNG, repeated for every image row"""
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def create_database(path, n_scalars, n_images, image_size, n_histograms):
+    """Scalars, images, histograms and series_stats laid out like the importer writes them"""
+    con = duckdb.connect(path)
+    n_series = STUDIES * len(SCALAR_TAGS) * len(MACHINES)
+    # Rows are numbered series by series, each series holds consecutive steps
+    con.execute(f"""
+    CREATE TABLE scalars AS
+    SELECT 'study_' || lpad((s // {len(SCALAR_TAGS) * len(MACHINES)})::VARCHAR, 4, '0') AS study,
+           {SCALAR_TAGS}[1 + (s // {len(MACHINES)}) % {len(SCALAR_TAGS)}] AS tag,
+           (i % {max(1, n_scalars // n_series)})::BIGINT AS step,
+           i * 0.01 AS wall_time,
+           random() AS value,
+           {MACHINES}[1 + s % {len(MACHINES)}] AS machine
+    FROM (SELECT i, i // {max(1, n_scalars // n_series)} AS s FROM range({n_scalars}) t(i))
+    """)
+    con.execute("""
+    CREATE TABLE series_stats AS
+    SELECT study, tag, machine,
+           count(*) AS count,
+           min(value) AS min_value, max(value) AS max_value,
+           arg_min(step, value) AS argmin_step, arg_max(step, value) AS argmax_step,
+           min(step) AS first_step, arg_min(value, step) AS first_value,
+           max(step) AS last_step, arg_max(value, step) AS last_value,
+           avg(value) AS mean,
+           coalesce(var_pop(value), 0) * count(*) AS m2,
+           coalesce(var_pop(value), 0) AS variance
+    FROM scalars GROUP BY study, tag, machine
+    """)
+    n_image_series = STUDIES * len(IMAGE_TAGS)
+    con.execute(f"""
+    CREATE TABLE images AS
+    SELECT 'study_' || lpad((s // {len(IMAGE_TAGS)})::VARCHAR, 4, '0') AS study,
+           {IMAGE_TAGS}[1 + s % {len(IMAGE_TAGS)}] AS tag,
+           (i % {max(1, n_images // n_image_series)})::BIGINT AS step,
+           i * 1.0 AS wall_time,
+           'PNG' AS image_format,
+           ?::BLOB AS image_data,
+           {MACHINES}[1 + i % 2] AS machine
+    FROM (SELECT i, i // {max(1, n_images // n_image_series)} AS s FROM range({n_images}) t(i))
+    """, [png_blob(image_size)])
+    n_histogram_series = STUDIES * len(HISTOGRAM_TAGS) * len(MACHINES)
+    # Normal-ish counts over fixed buckets, drifting with the step
+    con.execute(f"""
+    CREATE TABLE histograms AS
+    SELECT study, tag, step, wall_time, (-3.0 + shift)::DOUBLE AS min_value, (3.0 + shift)::DOUBLE AS max_value,
+           list_sum(bucket) AS num, bucket_limit, bucket, machine
+    FROM (
+        SELECT 'study_' || lpad((s // {len(HISTOGRAM_TAGS) * len(MACHINES)})::VARCHAR, 4, '0') AS study,
+               {HISTOGRAM_TAGS}[1 + (s // {len(MACHINES)}) % {len(HISTOGRAM_TAGS)}] AS tag,
+               (i % {max(1, n_histograms // n_histogram_series)})::BIGINT AS step,
+               i::DOUBLE AS wall_time,
+               (i % 100) * 0.01 AS shift,
+               [-3.0 + (i % 100) * 0.01 + (b + 1) * {6 / HISTOGRAM_BUCKETS} FOR b IN range({HISTOGRAM_BUCKETS})]::DOUBLE[] AS bucket_limit,
+               [round(1000 * exp(-((b - {HISTOGRAM_BUCKETS / 2}) / 6) ** 2)) FOR b IN range({HISTOGRAM_BUCKETS})]::DOUBLE[] AS bucket,
+               {MACHINES}[1 + s % {len(MACHINES)}] AS machine
+        FROM (SELECT i, i // {max(1, n_histograms // n_histogram_series)} AS s FROM range({n_histograms}) t(i))
+    )
+    """)
+    con.close()
+
+
+def operations(repo, study, tag, image_tag):
+    """(name, callable) for every repository query the viewer and the exports use"""
+    keys = [(study, t) for t in SCALAR_TAGS]
+    steps = repo.image_steps(study, image_tag)
+    page = steps[::max(1, len(steps) // 24)][:24]
+    return [
+        ('catalog', repo.catalog),
+        ('tags', lambda: repo.tags(study)),
+        ('image tags', lambda: repo.tags(study, 'image')),
+        ('all scalar tags', repo.all_scalar_tags),
+        ('series', lambda: repo.series(study, tag)),
+        ('series_batch', lambda: repo.series_batch(keys)),
+        ('plot combined', lambda: repo.plot_data(study, [tag], MACHINE_MODE_COMBINED)),
+        ('plot per machine', lambda: repo.plot_data(study, [tag], MACHINE_MODE_SPLIT)),
+        ('plot bands', lambda: repo.plot_data(study, [tag], MACHINE_MODE_BANDS)),
+        ('plot steps/s', lambda: repo.plot_data(study, [tag], MACHINE_MODE_SPLIT, METRIC_STEPS_PER_SEC, smoothing=50)),
+        ('plot ETA by time', lambda: repo.plot_data(study, [tag], MACHINE_MODE_BANDS, METRIC_ETA, X_WALL_TIME)),
+        ('series_stats', lambda: repo.series_stats(keys)),
+        ('leaderboard last', lambda: repo.leaderboard(tag, REDUCER_LAST)),
+        ('leaderboard mean N', lambda: repo.leaderboard(tag, REDUCER_MEAN_LAST_N)),
+        ('fingerprint', lambda: repo.fingerprint(study, tag, {})),
+        ('image_steps', lambda: repo.image_steps(study, image_tag)),
+        ('image_metadata', lambda: repo.image_metadata(study, image_tag)),
+        ('image_payload 24', lambda: repo.image_payload(study, image_tag, page)),
+        ('histogram tags', lambda: repo.tags(study, 'histogram')),
+        ('histogram_grid', lambda: repo.histogram_grid(study, HISTOGRAM_TAGS[0])),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the data access layer without the UI')
+    parser.add_argument('--db', default='bench_repository.duckdb', help='Database to generate or reuse')
+    parser.add_argument('--scalars', type=int, default=10**8, help='Scalar rows to generate (default: 1e8)')
+    parser.add_argument('--images', type=int, default=10**5, help='Image rows to generate (default: 1e5)')
+    parser.add_argument('--histograms', type=int, default=10**5, help='Histogram rows to generate (default: 1e5)')
+    parser.add_argument('--image-size', type=int, default=64, help='Side of the generated PNGs in pixels')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per operation')
+    parser.add_argument('--rebuild', action='store_true', help='Regenerate the database even if it exists')
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.db):
+        os.remove(args.db)
+    if not os.path.exists(args.db):
+        print(f"Generating {args.scalars} scalars, {args.images} images and {args.histograms} histograms in {args.db}")
+        t0 = time.perf_counter()
+        create_database(args.db, args.scalars, args.images, args.image_size, args.histograms)
+        print(f"Generated in {time.perf_counter() - t0:.1f}s")
+
+    repo = BrainStatsRepository(args.db)
+    study = f"study_{STUDIES // 2:04d}"
+    print(f"{'operation':<20} {'p50':>9} {'p99':>9}")
+    for name, op in operations(repo, study, SCALAR_TAGS[0], IMAGE_TAGS[0]):
+        op()  # warm-up
+        runs = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            op()
+            runs.append(time.perf_counter() - t0)
+        p50, p99 = np.percentile(runs, [50, 99]) * 1000
+        print(f"{name:<20} {p50:>7.2f}ms {p99:>7.2f}ms")
+    repo.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# check that a sharded import gives the same database as a single process, and time both
+# a small runs folder is generated, imported once in one process and once as N
+# `--shard i/N` processes running side by side whose shards are then merged; the
+# scalars, images, histograms and series_stats tables of the two must match
+#   python benchmarks/bench_shards.py --shards 4 --studies 8
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import duckdb
+import numpy as np
+from PIL import Image
+from tensorboard.compat.proto import event_pb2
+from tensorboard.compat.proto.summary_pb2 import HistogramProto, Summary
+from tensorboard.summary.writer.event_file_writer import EventFileWriter
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+from brain_stats_repository import sql_string
+
+IMPORTER = os.path.join(REPO, '0010_import_brain_stats_to_duckdb.py')
+
+MACHINES = ['zen', 'xen', 'ryzen']
+SCALAR_TAGS = ['Batch/Accuracy', 'Batch/Loss']
+IMAGE_EVERY = 10
+HISTOGRAM_EVERY = 10
+# series_stats of a single import are folded batch by batch, a merge rebuilds
+# them from all scalars at once, so the float columns may differ in the last bits
+STATS_KEY = ['study', 'tag', 'machine']
+STATS_EXACT = ['count', 'min_value', 'max_value', 'argmin_step', 'argmax_step',
+               'first_step', 'first_value', 'last_step', 'last_value']
+STATS_CLOSE = ['mean', 'm2', 'variance']
+STATS_RTOL = 1e-9
+
+
+def png_blob(rng, size=(32, 24)):
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def write_event_file(study_dir, machine, steps, rng):
+    """One event file named events.out.tfevents.<ts>.<machine>.<pid>.0, the importer takes the machine from it"""
+    tmp_dir = os.path.join(study_dir, f'.{machine}')
+    writer = EventFileWriter(tmp_dir)
+    t0 = 1.7e9
+    for step in range(steps):
+        values = [Summary.Value(tag=tag, simple_value=float(rng.random())) for tag in SCALAR_TAGS]
+        if step % IMAGE_EVERY == 0:
+            values.append(Summary.Value(tag='Brain/Viz', image=Summary.Image(
+                height=24, width=32, colorspace=3, encoded_image_string=png_blob(rng))))
+        if step % HISTOGRAM_EVERY == 0:
+            sample = rng.normal(size=500)
+            counts, edges = np.histogram(sample, bins=20)
+            values.append(Summary.Value(tag='Brain/Weights', histo=HistogramProto(
+                min=sample.min(), max=sample.max(), num=sample.size, sum=sample.sum(),
+                sum_squares=(sample * sample).sum(), bucket_limit=edges[1:].tolist(), bucket=counts.tolist())))
+        writer.add_event(event_pb2.Event(wall_time=t0 + step * 0.5, step=step, summary=Summary(value=values)))
+    writer.close()
+    (name,) = os.listdir(tmp_dir)
+    os.replace(os.path.join(tmp_dir, name), os.path.join(study_dir, f'events.out.tfevents.{int(t0)}.{machine}.1.0'))
+    os.rmdir(tmp_dir)
+
+
+def generate_runs(runs_dir, studies, steps, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(studies):
+        study_dir = os.path.join(runs_dir, f'study_{i:03d}')
+        os.makedirs(study_dir)
+        for machine in MACHINES:
+            write_event_file(study_dir, machine, steps, rng)
+
+
+def run_importer(*args):
+    subprocess.run([sys.executable, IMPORTER, *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def import_sharded(runs_dir, shard_dir, db_file, shards):
+    """All shards at once, as on separate hosts, then one merge"""
+    procs = [subprocess.Popen([sys.executable, IMPORTER, '--mode', 'reset', '--runs-dir', runs_dir,
+                               '--shard', f'{i}/{shards}', '--shard-dir', shard_dir],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for i in range(shards)]
+    for proc in procs:
+        if proc.wait() != 0:
+            raise RuntimeError(f"shard import exited with code {proc.returncode}")
+    shard_files = [os.path.join(shard_dir, f'shard-{i}-of-{shards}.duckdb') for i in range(shards)]
+    run_importer('--mode', 'reset', '--merge', *shard_files, '--db', db_file)
+
+
+def compare(single_file, merged_file):
+    """Differences between the two databases, an empty list when they match"""
+    con = duckdb.connect()
+    con.execute(f"ATTACH {sql_string(single_file)} AS single (READ_ONLY)")
+    con.execute(f"ATTACH {sql_string(merged_file)} AS merged (READ_ONLY)")
+    problems = []
+    for table in ('scalars', 'images', 'histograms'):
+        rows = con.execute(f"SELECT count(*) FROM single.{table}").fetchone()[0]
+        only_single = con.execute(f"SELECT count(*) FROM (FROM single.{table} EXCEPT ALL FROM merged.{table})").fetchone()[0]
+        only_merged = con.execute(f"SELECT count(*) FROM (FROM merged.{table} EXCEPT ALL FROM single.{table})").fetchone()[0]
+        if only_single or only_merged:
+            problems.append(f"{table}: {only_single} of {rows} rows only in the single import, "
+                            f"{only_merged} only in the merge")
+        print(f"{table:<13} {rows:>8} rows")
+    on = ' AND '.join(f"s.{c} = m.{c}" for c in STATS_KEY)
+    mismatched = ' OR '.join([f"s.{c} IS DISTINCT FROM m.{c}" for c in STATS_EXACT] +
+                             [f"abs(s.{c} - m.{c}) > {STATS_RTOL} * greatest(abs(s.{c}), abs(m.{c}), 1)"
+                              for c in STATS_CLOSE])
+    rows = con.execute("SELECT count(*) FROM single.series_stats").fetchone()[0]
+    unmatched = con.execute(f"""
+        SELECT count(*) FROM single.series_stats s FULL JOIN merged.series_stats m ON {on}
+        WHERE s.study IS NULL OR m.study IS NULL OR {mismatched}
+    """).fetchone()[0]
+    if unmatched:
+        problems.append(f"series_stats: {unmatched} of {rows} series differ")
+    print(f"{'series_stats':<13} {rows:>8} rows")
+    con.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare a sharded import with a single-process one')
+    parser.add_argument('--shards', type=int, default=3, help='Number of --shard processes (default: 3)')
+    parser.add_argument('--studies', type=int, default=6, help='Generated studies, each with one run per machine')
+    parser.add_argument('--steps', type=int, default=500, help='Steps per run')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated folder and print where it is')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='bench_shards_')
+    try:
+        runs_dir = os.path.join(work, 'runs')
+        generate_runs(runs_dir, args.studies, args.steps)
+        single_file = os.path.join(work, 'single.duckdb')
+        merged_file = os.path.join(work, 'merged.duckdb')
+
+        t0 = time.perf_counter()
+        run_importer('--mode', 'reset', '--runs-dir', runs_dir, '--db', single_file)
+        t1 = time.perf_counter()
+        import_sharded(runs_dir, os.path.join(work, 'shards'), merged_file, args.shards)
+        t2 = time.perf_counter()
+        print(f"single process {t1 - t0:>8.2f} s")
+        print(f"{args.shards} shards+merge {t2 - t1:>8.2f} s")
+
+        problems = compare(single_file, merged_file)
+    finally:
+        if args.keep:
+            print(f"Kept {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+    if problems:
+        for problem in problems:
+            print(problem)
+        sys.exit(1)
+    print("Sharded import matches the single-process import")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# time how long the viewer takes to come up, each run in a fresh interpreter:
+#   import  - importing 0020_create_ui_for_showing_graphs
+#   eager   - importing duckdb, numpy, PIL and matplotlib up front, as the viewer used to
+#   window  - process start until the window has been drawn
+#   snapshot - until the picture of the last plot saved on close is on screen
+#   catalog - until the study list is filled in
+#   plot    - until the last viewed plot is back on screen: drawn again, or the snapshot
+#             once the catalog found it still current and kept it
+# window/catalog/plot need a display, run it from the folder with brain_stats.duckdb and
+# brain_stats_settings.json to include the restore of the last view
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_CHILD = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {repo!r})
+importlib.import_module('0020_create_ui_for_showing_graphs')
+print(json.dumps({{'import': time.perf_counter() - t0}}))
+"""
+
+EAGER_CHILD = """
+import importlib, json, time
+t0 = time.perf_counter()
+for name in ['duckdb', 'numpy', 'PIL.ImageTk', 'matplotlib.pyplot', 'matplotlib.backends.backend_tkagg']:
+    importlib.import_module(name)
+print(json.dumps({'eager': time.perf_counter() - t0}))
+"""
+
+UI_CHILD = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {repo!r})
+viewer = importlib.import_module('0020_create_ui_for_showing_graphs')
+# leave the settings file and the snapshot as they were, the viewer saves both on
+# the way (study selection, plot changes) and not only on close
+viewer.BrainStatsUI.save_settings = lambda self: None
+viewer.BrainStatsUI.save_snapshot = lambda self: None
+root = viewer.tk.Tk()
+app = viewer.BrainStatsUI(root)
+root.update()
+timings = {{'window': time.perf_counter() - t0}}
+deadline = t0 + {timeout}
+while time.perf_counter() < deadline and ('catalog' not in timings or 'plot' not in timings):
+    root.update()
+    if 'snapshot' not in timings and app.snapshot_label is not None:
+        timings['snapshot'] = time.perf_counter() - t0
+    if 'catalog' not in timings and app.catalog_loaded:
+        timings['catalog'] = time.perf_counter() - t0
+    # The catalog load decides on the spot whether the snapshot stays, a snapshot
+    # still up once it is done is the restored view
+    kept = app.catalog_loaded and app.snapshot_label is not None
+    if 'plot' not in timings and (getattr(app, 'scalar_canvas', None) is not None or kept):
+        timings['plot'] = time.perf_counter() - t0
+    time.sleep(0.005)
+app.on_close()
+print(json.dumps(timings))
+"""
+
+
+def run_child(code, cwd):
+    """Run code in a fresh interpreter and return the timings it prints"""
+    output = subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark viewer startup in fresh processes')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the median is reported')
+    parser.add_argument('--cwd', default='.', help='Folder to start the viewer in (database and settings file)')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for the catalog and plot')
+    args = parser.parse_args()
+
+    children = [IMPORT_CHILD.format(repo=REPO), EAGER_CHILD]
+    has_display = sys.platform in ('win32', 'darwin') or os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')
+    if has_display:
+        children.append(UI_CHILD.format(repo=REPO, timeout=args.timeout))
+    else:
+        print("No display, only measuring imports")
+
+    runs = {}
+    for code in children:
+        for _ in range(args.repeat):
+            for name, seconds in run_child(code, args.cwd).items():
+                runs.setdefault(name, []).append(seconds)
+    for name in ('import', 'eager', 'window', 'snapshot', 'catalog', 'plot'):
+        if name in runs:
+            print(f"{name:<8} {statistics.median(runs[name]) * 1000:>8.0f} ms  ({len(runs[name])} runs)")
+
+
+if __name__ == '__main__':
+    main()
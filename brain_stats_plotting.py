@@ -0,0 +1,171 @@
+# plot styling and drawing shared by the viewer and the export scripts
+# nothing in here touches tkinter, so plots can be rendered without a display
+from brain_stats_repository import (
+    MACHINE_MODE_COMBINED, MACHINE_MODE_SPLIT, MACHINE_MODE_BANDS, METRIC_VALUE, X_STEP, X_WALL_TIME,
+    fetch_plot_data,
+)
+# matplotlib is imported inside the functions that use it, the viewer imports
+# this module before its window is up
+
+
+# Define color palette for multiple lines
+COLOR_PALETTE = ['blue', 'red', 'green', 'purple', 'orange', 'brown', 'pink', 'gray', 'olive', 'cyan']
+
+# Plot settings as stored in brain_stats_settings.json
+DEFAULT_PLOT_STYLE = {
+    'log_scale': False,
+    'show_dots': True,
+    'h_grid': False,
+    'v_grid': False,
+    'grid_color': 'gray',
+    'line_color': 'blue',
+    'machine_mode': MACHINE_MODE_COMBINED,
+    'metric': METRIC_VALUE,
+    'x_axis': X_STEP,
+    'smoothing': 1,
+    'eta_target': None,
+}
+
+
+def series_options(style):
+    """The plot_data arguments that pick which series a plot style shows"""
+    return {key: style[key] for key in ('metric', 'x_axis', 'smoothing', 'eta_target')}
+
+
+def label_axes(ax, style):
+    ax.set_xlabel(style['x_axis'])
+    ax.set_ylabel("Value" if style['metric'] == METRIC_VALUE else style['metric'])
+    if style['x_axis'] == X_WALL_TIME:
+        # Dates with times do not fit side by side
+        ax.figure.autofmt_xdate()
+
+
+def format_tag_for_display(tag):
+    """Replace 'Brain' with 'PGC' in tag names for display"""
+    if tag:
+        return tag.replace("Brain", "PGC")
+    return tag
+
+
+def sanitize_filename(filename):
+    """Remove characters that are problematic in filenames"""
+    if not filename:
+        return "unnamed"
+        
+    # Replace slashes, backslashes and other problematic characters
+    invalid_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
+    result = filename
+    for char in invalid_chars:
+        result = result.replace(char, '_')
+        
+    return result
+
+
+def style_axes(ax, style):
+    """Scale, minor ticks and grid lines shared by every scalar plot"""
+    from matplotlib.ticker import AutoMinorLocator, LogLocator
+    # First set scale, which affects grid behavior
+    if style['log_scale']:
+        ax.set_yscale('log')
+        # Also add more ticks for denser grid in log mode
+        ax.yaxis.set_minor_locator(LogLocator(subs=range(2, 10)))
+    else:
+        # Add more y-axis ticks for denser grid in linear mode
+        ax.yaxis.set_minor_locator(AutoMinorLocator(4))
+        
+    # Add minor x-axis ticks for denser grid
+    ax.xaxis.set_minor_locator(AutoMinorLocator(4))
+    
+    # Apply grid settings
+    grid_color = style['grid_color']
+    
+    # Horizontal grid
+    if style['h_grid']:
+        # Major grid lines
+        ax.yaxis.grid(True, which='major', linestyle='-', alpha=0.5, color=grid_color)
+        # Minor grid lines
+        ax.yaxis.grid(True, which='minor', linestyle=':', alpha=0.3, color=grid_color)
+    else:
+        ax.yaxis.grid(False)
+    
+    # Vertical grid
+    if style['v_grid']:
+        # Major grid lines
+        ax.xaxis.grid(True, which='major', linestyle='-', alpha=0.5, color=grid_color)
+        # Minor grid lines
+        ax.xaxis.grid(True, which='minor', linestyle=':', alpha=0.3, color=grid_color)
+    else:
+        ax.xaxis.grid(False)
+
+
+def draw_plot_data(ax, data, study, tag_pairs, colors, machine_mode, show_dots, wall_clock=False):
+    """Draw what fetch_plot_data returned, returns the lines Live mode can extend"""
+    marker = 'o' if show_dots else None
+
+    def x_values(x):
+        # Wall times are seconds since the epoch, as dates matplotlib puts a clock on the axis
+        return (x * 1e6).astype('datetime64[us]') if wall_clock else x
+
+    live_lines = {}
+    color_idx = 0
+    for display_tag, original_tag in tag_pairs:
+        if machine_mode == MACHINE_MODE_SPLIT:
+            # One line per machine, every line gets its own color
+            machine_keys = sorted((k for k in data if k[:2] == (study, original_tag)), key=lambda k: str(k[2]))
+            for key in machine_keys:
+                steps, values = data[key]
+                line, = ax.plot(x_values(steps), values, marker=marker, color=colors[color_idx % len(colors)],
+                                label=f"{display_tag} [{key[2]}]")
+                live_lines[key] = line
+                color_idx += 1
+        elif machine_mode == MACHINE_MODE_BANDS:
+            color = colors[color_idx % len(colors)]
+            color_idx += 1
+            band = data.get((study, original_tag))
+            if band is None:
+                continue
+            x = x_values(band['step'])
+            ax.fill_between(x, band['min'], band['max'], color=color, alpha=0.1, linewidth=0)
+            ax.fill_between(x, band['mean'] - band['std'], band['mean'] + band['std'],
+                            color=color, alpha=0.3, linewidth=0)
+            ax.plot(x, band['mean'], marker=marker, color=color,
+                    label=f"{display_tag} (mean of {int(band['machines'].max())} machines)")
+        else:
+            color = colors[color_idx % len(colors)]
+            color_idx += 1
+            if (study, original_tag) not in data:
+                continue
+            steps, values = data[(study, original_tag)]
+            line, = ax.plot(x_values(steps), values, marker=marker, color=color, label=display_tag)
+            live_lines[(study, original_tag)] = line
+    return live_lines
+
+
+def draw_multi_tag_plot(ax, con, study, tag_pairs, style, data=None):
+    """The 'Plot Selected' figure: several (display, original) tags of one study on one axes.
+
+    data is what fetch_plot_data returns for these tags, queried here if not given.
+    """
+    style_axes(ax, style)
+    
+    # Get base color
+    line_color = style['line_color']
+    base_color_idx = COLOR_PALETTE.index(line_color) if line_color in COLOR_PALETTE else 0
+    
+    # Get data for all selected tags in one round trip
+    if data is None:
+        data = fetch_plot_data(con, study, [original for _, original in tag_pairs], style['machine_mode'],
+                               **series_options(style))
+    
+    # Plot each selected tag, cycling colors through the palette
+    colors = [COLOR_PALETTE[(base_color_idx + i) % len(COLOR_PALETTE)] for i in range(len(COLOR_PALETTE))]
+    live_lines = draw_plot_data(ax, data, study, tag_pairs, colors, style['machine_mode'], style['show_dots'],
+                                wall_clock=style['x_axis'] == X_WALL_TIME)
+    
+    # Set title and labels
+    ax.set_title(f"Multiple Tags ({study})")
+    label_axes(ax, style)
+    
+    # Add legend
+    ax.legend()
+    return live_lines
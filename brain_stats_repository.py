@@ -0,0 +1,702 @@
+# data access for brain_stats.duckdb, shared by the viewer, the export scripts and the benchmarks
+# nothing in here touches tkinter, so every query can be run and timed without a display
+import os
+import json
+import hashlib
+# duckdb and numpy are imported inside the functions that use them, the viewer
+# imports this module before its window is up
+
+DB_PATH = 'brain_stats.duckdb'
+
+# How series from several machines are drawn
+MACHINE_MODE_COMBINED = 'Combined'
+MACHINE_MODE_SPLIT = 'Per machine'
+MACHINE_MODE_BANDS = 'Mean/std bands'
+BAND_GRID_POINTS = 1000
+
+# Leaderboard reducers and page size
+REDUCER_LAST = 'last'
+REDUCER_MAX = 'max'
+REDUCER_MIN = 'min'
+REDUCER_MEAN_LAST_N = 'mean of last N'
+LEADERBOARD_PAGE_SIZE = 50
+
+# Value bins of the histogram heatmap
+HISTOGRAM_BINS = 64
+
+# What a scalar plot shows on the y axis: the values, or the training speed of
+# the series derived from its step and wall_time columns
+METRIC_VALUE = 'value'
+METRIC_STEPS_PER_SEC = 'steps/s'
+METRIC_SEC_PER_STEP = 's/step'
+METRIC_ETA = 'ETA (s)'
+# and on the x axis
+X_STEP = 'Step'
+X_WALL_TIME = 'Wall time'
+
+# Several sources are read as one database: any mix of DuckDB files and Parquet
+# datasets laid out as <dataset>/<table>/study=.../machine=.../*.parquet. Each
+# table becomes a UNION ALL view over the sources that have it
+TABLE_COLUMNS = {
+    'scalars': {'study': 'VARCHAR', 'tag': 'VARCHAR', 'step': 'BIGINT', 'wall_time': 'DOUBLE',
+                'value': 'DOUBLE', 'machine': 'VARCHAR'},
+    'images': {'study': 'VARCHAR', 'tag': 'VARCHAR', 'step': 'BIGINT', 'wall_time': 'DOUBLE',
+               'image_format': 'VARCHAR', 'image_data': 'BLOB', 'machine': 'VARCHAR'},
+    'histograms': {'study': 'VARCHAR', 'tag': 'VARCHAR', 'step': 'BIGINT', 'wall_time': 'DOUBLE',
+                   'min_value': 'DOUBLE', 'max_value': 'DOUBLE', 'num': 'DOUBLE',
+                   'bucket_limit': 'DOUBLE[]', 'bucket': 'DOUBLE[]', 'machine': 'VARCHAR'},
+    'series_stats': {'study': 'VARCHAR', 'tag': 'VARCHAR', 'machine': 'VARCHAR', 'count': 'BIGINT',
+                     'min_value': 'DOUBLE', 'max_value': 'DOUBLE', 'argmin_step': 'BIGINT', 'argmax_step': 'BIGINT',
+                     'first_step': 'BIGINT', 'first_value': 'DOUBLE', 'last_step': 'BIGINT', 'last_value': 'DOUBLE',
+                     'mean': 'DOUBLE', 'm2': 'DOUBLE', 'variance': 'DOUBLE'},
+}
+
+
+def as_float_array(column):
+    """float64 view of a fetchnumpy column, NULLs (masked entries) become NaN"""
+    import numpy as np
+    if np.ma.isMaskedArray(column):
+        return column.astype(np.float64).filled(np.nan)
+    return np.asarray(column, dtype=np.float64)
+
+
+def fetch_column(con, query, params=None):
+    """Run a single-column query and return its values as a list"""
+    result = con.execute(query, params or []).fetchnumpy()
+    return next(iter(result.values())).tolist()
+
+
+def fetch_series(con, study, tag):
+    """Steps (int64) and values (float64) of one scalar series, ordered by step"""
+    import numpy as np
+    result = con.execute(
+        "SELECT step, value FROM scalars WHERE study=? AND tag=? ORDER BY step", [study, tag]
+    ).fetchnumpy()
+    return np.asarray(result['step'], dtype=np.int64), as_float_array(result['value'])
+
+
+def scalar_source(metric=METRIC_VALUE, x_axis=X_STEP, smoothing=1, eta_target=None):
+    """SQL relation over scalars with study, tag, machine, x and value columns.
+
+    x is the step or the wall time. The derived metrics compare each row with
+    the one smoothing rows before it in the same (study, tag, machine), so
+    steps/s and s/step are rolling averages over smoothing intervals. The ETA
+    is the time left to eta_target at that speed, or to the last step any
+    machine reached when there is no target. Rows without a wall time drop
+    out of anything that needs one.
+    """
+    x = 'step' if x_axis == X_STEP else 'wall_time'
+    if metric == METRIC_VALUE:
+        where = '' if x_axis == X_STEP else 'WHERE wall_time IS NOT NULL'
+        return f"(SELECT study, tag, machine, {x} AS x, value FROM scalars {where})"
+    steps = "(step - first_value(step) OVER w)"
+    seconds = "(wall_time - first_value(wall_time) OVER w)"
+    target = int(eta_target) if eta_target is not None else "max(step) OVER (PARTITION BY study, tag)"
+    value = {
+        METRIC_STEPS_PER_SEC: f"{steps} / nullif({seconds}, 0)",
+        METRIC_SEC_PER_STEP: f"{seconds} / nullif({steps}, 0)",
+        METRIC_ETA: f"greatest({target} - step, 0) * {seconds} / nullif({steps}, 0)",
+    }[metric]
+    # The window's first row has nothing before it and comes out NULL
+    return f"""(
+        SELECT * FROM (
+            SELECT study, tag, machine, {x} AS x, {value} AS value
+            FROM scalars
+            WHERE wall_time IS NOT NULL
+            WINDOW w AS (PARTITION BY study, tag, machine ORDER BY step
+                         ROWS BETWEEN {max(1, int(smoothing))} PRECEDING AND CURRENT ROW)
+        ) WHERE value IS NOT NULL
+    )"""
+
+
+def fetch_series_batch(con, keys, after_steps=None, by_machine=False, source=None):
+    """Fetch the scalar series of many (study, tag) pairs in a single query.
+
+    Returns a dict mapping each (study, tag) that has data to a
+    (steps, values) pair of NumPy arrays ordered by step. The arrays are
+    views into one result set, so nothing is copied per series.
+    after_steps optionally maps a key to the last step already known, only
+    later rows are fetched for it. With by_machine every machine gets its
+    own series, keyed (study, tag, machine). source is a scalar_source
+    relation, the plain values against steps by default.
+    """
+    import numpy as np
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    after_steps = after_steps or {}
+    studies = sorted({study for study, _ in keys})
+    tags = sorted({tag for _, tag in keys})
+    key_rows = ', '.join(['(?, ?, ?, ?::BIGINT)'] * len(keys))
+    query = f"""
+        SELECT k.key_idx, s.machine, s.x AS step, s.value
+        FROM {source or scalar_source()} s
+        JOIN (VALUES {key_rows}) AS k(key_idx, study, tag, after_step)
+          ON s.study = k.study AND s.tag = k.tag
+        WHERE s.study IN ({', '.join(['?'] * len(studies))})
+          AND s.tag IN ({', '.join(['?'] * len(tags))})
+          AND (k.after_step IS NULL OR s.x > k.after_step)
+        ORDER BY k.key_idx, {'s.machine, ' if by_machine else ''}s.x
+    """
+    params = [p for i, key in enumerate(keys) for p in (i, key[0], key[1], after_steps.get(key))] + studies + tags
+    result = con.execute(query, params).fetchnumpy()
+    key_idx = np.asarray(result['key_idx'])
+    # int64 steps, or float64 seconds when x is the wall time
+    steps = np.asarray(result['step'])
+    values = as_float_array(result['value'])
+    if by_machine:
+        # Rows are grouped by key_idx then machine, cut wherever either changes
+        machines = result['machine']
+        cuts = np.flatnonzero((key_idx[1:] != key_idx[:-1]) | (machines[1:] != machines[:-1])) + 1
+        starts = np.concatenate(([0], cuts))
+        ends = np.concatenate((cuts, [len(key_idx)]))
+        series = {}
+        for start, end in zip(starts, ends):
+            if end > start:
+                study, tag = keys[key_idx[start]]
+                series[(study, tag, machines[start])] = (steps[start:end], values[start:end])
+        return series
+    # Rows are grouped by key_idx, so each series is one contiguous slice
+    bounds = np.searchsorted(key_idx, np.arange(len(keys) + 1))
+    series = {}
+    for i, key in enumerate(keys):
+        start, end = bounds[i], bounds[i + 1]
+        if end > start:
+            series[key] = (steps[start:end], values[start:end])
+    return series
+
+
+def fetch_machine_bands(con, keys, grid_points=BAND_GRID_POINTS, source=None):
+    """Mean, standard deviation and min/max across machines on a common step grid.
+
+    Steps of each (study, tag) are bucketed into at most grid_points
+    buckets; every machine contributes its average per bucket and the
+    statistics are taken over machines. All of it runs inside DuckDB, only
+    the aggregated arrays come back, keyed by (study, tag). source is a
+    scalar_source relation, the x axis it picks is bucketed the same way.
+    """
+    import numpy as np
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    studies = sorted({study for study, _ in keys})
+    tags = sorted({tag for _, tag in keys})
+    key_rows = ', '.join(['(?, ?, ?)'] * len(keys))
+    query = f"""
+        WITH src AS (
+            SELECT k.key_idx, s.machine, s.x AS step, s.value
+            FROM {source or scalar_source()} s
+            JOIN (VALUES {key_rows}) AS k(key_idx, study, tag)
+              ON s.study = k.study AND s.tag = k.tag
+            WHERE s.study IN ({', '.join(['?'] * len(studies))})
+              AND s.tag IN ({', '.join(['?'] * len(tags))})
+        ),
+        grid AS (
+            SELECT key_idx,
+                   min(step) AS lo,
+                   greatest(1, ceil((max(step) - min(step) + 1) / ?::DOUBLE))::BIGINT AS width
+            FROM src
+            GROUP BY key_idx
+        ),
+        per_machine AS (
+            SELECT src.key_idx, src.machine,
+                   g.lo + (src.step - g.lo) // g.width * g.width AS step,
+                   avg(src.value) AS value
+            FROM src JOIN grid g USING (key_idx)
+            GROUP BY ALL
+        )
+        SELECT key_idx, step,
+               avg(value) AS mean,
+               coalesce(stddev_pop(value), 0) AS std,
+               min(value) AS min,
+               max(value) AS max,
+               count(*) AS machines
+        FROM per_machine
+        GROUP BY key_idx, step
+        ORDER BY key_idx, step
+    """
+    params = [p for i, (study, tag) in enumerate(keys) for p in (i, study, tag)] + studies + tags + [grid_points]
+    result = con.execute(query, params).fetchnumpy()
+    key_idx = np.asarray(result['key_idx'])
+    bounds = np.searchsorted(key_idx, np.arange(len(keys) + 1))
+    bands = {}
+    for i, key in enumerate(keys):
+        start, end = bounds[i], bounds[i + 1]
+        if end > start:
+            bands[key] = {
+                'step': np.asarray(result['step'][start:end]),
+                'mean': as_float_array(result['mean'][start:end]),
+                'std': as_float_array(result['std'][start:end]),
+                'min': as_float_array(result['min'][start:end]),
+                'max': as_float_array(result['max'][start:end]),
+                'machines': np.asarray(result['machines'][start:end]),
+            }
+    return bands
+
+
+def has_table(con, name):
+    return con.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+
+def fetch_catalog(con, table='scalars'):
+    """Sorted machines, sorted studies and the (machine, study) pairs, from one scan of table"""
+    result = con.execute(f"SELECT DISTINCT machine, study FROM {table}").fetchnumpy()
+    pairs = list(zip(result['machine'].tolist(), result['study'].tolist()))
+    machines = sorted({machine for machine, _ in pairs})
+    studies = sorted({study for _, study in pairs})
+    return machines, studies, pairs
+
+
+def fetch_series_stats(con, keys):
+    """Importer-maintained summaries for (study, tag) pairs, one row per machine"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return []
+    key_rows = ', '.join(['(?, ?, ?)'] * len(keys))
+    query = f"""
+        SELECT s.tag, s.machine, s.count, s.last_step, s.last_value,
+               s.min_value, s.argmin_step, s.max_value, s.argmax_step,
+               s.mean, sqrt(s.variance) AS std
+        FROM series_stats s
+        JOIN (VALUES {key_rows}) AS k(key_idx, study, tag)
+          ON s.study = k.study AND s.tag = k.tag
+        ORDER BY k.key_idx, s.machine
+    """
+    params = [p for i, (study, tag) in enumerate(keys) for p in (i, study, tag)]
+    return con.execute(query, params).fetchall()
+
+
+def fetch_leaderboard(con, tag, reducer, last_n=10, ascending=False, limit=LEADERBOARD_PAGE_SIZE, offset=0,
+                      use_stats=False):
+    """Rank every study by one tag, reduced to a single score per study.
+
+    Scoring, ranking and paging all happen in one query; only the requested
+    page comes back as (rank, study, score, last_step) rows, together with
+    the total number of ranked studies. last/max/min are read from
+    series_stats when use_stats is set, mean of the last N steps always
+    needs the scalars themselves.
+
+    last is the mean of the values at the study's last step: machines that
+    end on the same step are averaged instead of one of them being picked,
+    so the score does not depend on row order or on the source.
+    """
+    if reducer == REDUCER_LAST:
+        table, step, value = ('series_stats', 'last_step', 'last_value') if use_stats else ('scalars', 'step', 'value')
+        scores = f"""
+            SELECT t.study, avg(t.{value}) AS score, l.last_step
+            FROM {table} t
+            JOIN (SELECT study, max({step}) AS last_step FROM {table} WHERE tag = ? GROUP BY study) l
+              ON t.study = l.study AND t.{step} = l.last_step
+            WHERE t.tag = ?
+            GROUP BY t.study, l.last_step
+        """
+        params = [tag, tag]
+    elif use_stats and reducer != REDUCER_MEAN_LAST_N:
+        score = {
+            REDUCER_MAX: 'max(max_value)',
+            REDUCER_MIN: 'min(min_value)',
+        }[reducer]
+        scores = f"""
+            SELECT study, {score} AS score, max(last_step) AS last_step
+            FROM series_stats WHERE tag = ? GROUP BY study
+        """
+        params = [tag]
+    else:
+        score = {
+            REDUCER_MAX: 'max(value)',
+            REDUCER_MIN: 'min(value)',
+            # Top-N by step per study, a bounded heap instead of sorting every series
+            REDUCER_MEAN_LAST_N: 'list_avg(arg_max(value, step, ?))',
+        }[reducer]
+        scores = f"""
+            SELECT study, {score} AS score, max(step) AS last_step
+            FROM scalars WHERE tag = ? GROUP BY study
+        """
+        params = ([int(last_n)] if reducer == REDUCER_MEAN_LAST_N else []) + [tag]
+    order = 'ASC' if ascending else 'DESC'
+    query = f"""
+        WITH scores AS ({scores})
+        SELECT rank() OVER (ORDER BY score {order} NULLS LAST) AS rank,
+               study, score, last_step,
+               count(*) OVER () AS total
+        FROM scores
+        ORDER BY rank, study
+        LIMIT ? OFFSET ?
+    """
+    rows = con.execute(query, params + [limit, offset]).fetchall()
+    total = rows[0][4] if rows else 0
+    return [row[:4] for row in rows], total
+
+
+def plot_fingerprint(con, study, tag, style, has_series_stats):
+    """Hash of what a scalar plot shows: row counts and last points per machine, and the style"""
+    if has_series_stats:
+        rows = con.execute(
+            "SELECT machine, count, last_step, last_value FROM series_stats WHERE study=? AND tag=? ORDER BY machine",
+            [study, tag]).fetchall()
+    else:
+        rows = con.execute(
+            """SELECT machine, count(*), max(step), sum(value) FROM scalars
+               WHERE study=? AND tag=? GROUP BY machine ORDER BY machine""",
+            [study, tag]).fetchall()
+    payload = json.dumps([study, tag, rows, style], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def fetch_plot_data(con, study, original_tags, machine_mode, metric=METRIC_VALUE, x_axis=X_STEP, smoothing=1,
+                    eta_target=None):
+    """Query the series for the given tags in the given machine mode, one round trip.
+
+    metric, x_axis, smoothing and eta_target pick the series, see scalar_source.
+    """
+    keys = [(study, tag) for tag in original_tags]
+    source = scalar_source(metric, x_axis, smoothing, eta_target)
+    if machine_mode == MACHINE_MODE_SPLIT:
+        return fetch_series_batch(con, keys, by_machine=True, source=source)
+    if machine_mode == MACHINE_MODE_BANDS:
+        return fetch_machine_bands(con, keys, source=source)
+    return fetch_series_batch(con, keys, source=source)
+
+
+def db_watermark(path=DB_PATH):
+    """Cheap change marker for the database: size and mtime of the file and its WAL.
+
+    The importer commits through the WAL and checkpoints into the main
+    file, so any new rows move one of the two.
+    """
+    marks = []
+    for p in (path, path + '.wal'):
+        try:
+            st = os.stat(p)
+            marks.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            marks.append(None)
+    return tuple(marks)
+
+
+def sql_string(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def is_parquet_dataset(path):
+    return os.path.isdir(path) and any(os.path.isdir(os.path.join(path, table)) for table in TABLE_COLUMNS)
+
+
+def expand_sources(sources):
+    """DuckDB files and Parquet datasets behind sources, a plain folder stands for everything in it.
+
+    Dropping another machine's brain_stats.duckdb (or its Parquet export)
+    into such a folder is all it takes to add it.
+    """
+    expanded = []
+    for source in sources:
+        if os.path.isdir(source) and not is_parquet_dataset(source):
+            for name in sorted(os.listdir(source)):
+                path = os.path.join(source, name)
+                if name.endswith('.duckdb') or is_parquet_dataset(path):
+                    expanded.append(path)
+        else:
+            expanded.append(source)
+    return expanded
+
+
+def has_parquet_files(path):
+    """True at the first .parquet file under path, read_parquet fails on a pattern matching nothing"""
+    for _, _, filenames in os.walk(path):
+        if any(name.endswith('.parquet') for name in filenames):
+            return True
+    return False
+
+
+def parquet_scan(dataset, table):
+    # Partition values stay strings, a study named 20250515 must not turn into a number
+    pattern = os.path.join(dataset, table, '**', '*.parquet')
+    return f"read_parquet({sql_string(pattern)}, hive_partitioning=true, hive_types_autocast=false, union_by_name=true)"
+
+
+def attach_sources(con, sources):
+    """Attach every source to con and create one view per table over all of them.
+
+    Returns the names of the views created. The views are plain UNION ALLs,
+    so DuckDB pushes the study/machine/tag filters of every query down into
+    each branch: attached files use their zonemaps, Parquet datasets skip
+    whole partitions. series_stats is only created when every source with
+    scalars has it, otherwise the summaries would miss rows.
+    """
+    branches = {table: [] for table in TABLE_COLUMNS}
+    for i, source in enumerate(sources):
+        if os.path.isdir(source):
+            present = {table for table in TABLE_COLUMNS if has_parquet_files(os.path.join(source, table))}
+            for table in present:
+                branches[table].append(parquet_scan(source, table))
+        else:
+            alias = f"src{i}"
+            con.execute(f"ATTACH {sql_string(source)} AS {alias} (READ_ONLY)")
+            present = set(fetch_column(con, "SELECT table_name FROM duckdb_tables() WHERE database_name = ?", [alias]))
+            for table in TABLE_COLUMNS:
+                if table in present:
+                    branches[table].append(f"{alias}.main.{table}")
+    views = []
+    for table, columns in TABLE_COLUMNS.items():
+        if table == 'series_stats' and len(branches[table]) < len(branches['scalars']):
+            continue
+        if branches[table]:
+            names = ', '.join(columns)
+            select = ' UNION ALL '.join(f"SELECT {names} FROM {branch}" for branch in branches[table])
+        else:
+            # Keep queries working against sources that have none of this table
+            select = "SELECT " + ', '.join(f"NULL::{kind} AS {name}" for name, kind in columns.items()) + " WHERE false"
+        con.execute(f"CREATE VIEW {table} AS {select}")
+        views.append(table)
+    return views
+
+
+def source_watermark(source):
+    """db_watermark for a file, file count, total size and newest mtime for a folder"""
+    if not os.path.isdir(source):
+        return db_watermark(source)
+    files, size, newest = 0, 0, 0
+    for dirpath, _, filenames in os.walk(source):
+        for name in filenames:
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            files, size, newest = files + 1, size + st.st_size, max(newest, st.st_mtime_ns)
+    return (files, size, newest)
+
+
+def fetch_tags(con, study, kind='scalar'):
+    """Sorted tag names of one study, kind is 'scalar', 'image' or 'histogram'"""
+    table = {'scalar': 'scalars', 'image': 'images', 'histogram': 'histograms'}[kind]
+    return fetch_column(con, f"SELECT DISTINCT tag FROM {table} WHERE study=? ORDER BY tag", [study])
+
+
+def fetch_image_steps(con, study, tag):
+    """Distinct steps (int64) of an image series, without reading any image data"""
+    import numpy as np
+    result = con.execute(
+        "SELECT DISTINCT step FROM images WHERE study=? AND tag=? ORDER BY step", [study, tag]
+    ).fetchnumpy()
+    return np.asarray(result['step'], dtype=np.int64)
+
+
+def fetch_image_metadata(con, study, tag):
+    """Step, wall time and machine of every image row, ordered by step, without the blobs"""
+    import numpy as np
+    result = con.execute(
+        "SELECT step, wall_time, machine FROM images WHERE study=? AND tag=? ORDER BY step, machine", [study, tag]
+    ).fetchnumpy()
+    return {
+        'step': np.asarray(result['step'], dtype=np.int64),
+        'wall_time': as_float_array(result['wall_time']),
+        'machine': np.asarray(result['machine']),
+    }
+
+
+def fetch_image_payload(con, study, tag, steps):
+    """Image blobs for the given steps as {step: bytes}, one machine per step"""
+    steps = [int(step) for step in steps]
+    if not steps:
+        return {}
+    placeholders = ', '.join(['?'] * len(steps))
+    rows = con.execute(
+        f"""SELECT DISTINCT ON (step) step, image_data FROM images
+            WHERE study=? AND tag=? AND step IN ({placeholders})
+            ORDER BY step, machine""",
+        [study, tag] + steps).fetchall()
+    return dict(rows)
+
+
+def fetch_images(con, study, tag):
+    """Every image row of a series: steps (int64) and the blobs, ordered by step"""
+    import numpy as np
+    result = con.execute(
+        "SELECT step, image_data FROM images WHERE study=? AND tag=? ORDER BY step", [study, tag]
+    ).fetchnumpy()
+    return np.asarray(result['step'], dtype=np.int64), list(result['image_data'])
+
+
+def fetch_histogram_grid(con, study, tag, bins=HISTOGRAM_BINS):
+    """Every histogram of a tag rebinned onto one value grid, for a steps x values heatmap.
+
+    The buckets are unnested in DuckDB and each bucket's count is spread over
+    the grid bins it overlaps; machines are summed per step. Returns the
+    steps (int64), bins + 1 value edges and a bins x steps array holding
+    each step's share of values per bin, or None if the tag has no data.
+    """
+    import numpy as np
+    result = con.execute("""
+        WITH buckets AS (
+            SELECT step, min_value, max_value,
+                   -- a bucket starts where the previous one ends, the first at the minimum
+                   unnest(list_concat([min_value], bucket_limit[1:len(bucket_limit) - 1])) AS lo,
+                   unnest(bucket_limit) AS hi,
+                   unnest(bucket) AS n
+            FROM histograms WHERE study = ? AND tag = ?
+        ),
+        clamped AS (
+            -- TensorBoard's outermost buckets reach to +-DBL_MAX, cut them at the data
+            SELECT step, greatest(lo, min_value) AS l, greatest(least(hi, max_value), greatest(lo, min_value)) AS r, n
+            FROM buckets WHERE n > 0
+        ),
+        grid AS (SELECT min(l) AS g0, greatest(max(r) - min(l), 1e-300) / ? AS w FROM clamped),
+        spans AS (
+            SELECT step, l, r, n, g0, w,
+                   unnest(range(least(floor((l - g0) / w)::BIGINT, ? - 1),
+                                least(floor((r - g0) / w)::BIGINT, ? - 1) + 1)) AS bin
+            FROM clamped, grid
+        )
+        SELECT step, bin,
+               -- the part of the bucket inside the bin, all of it for a single value
+               sum(CASE WHEN r > l THEN n * greatest(least(r, g0 + (bin + 1) * w) - greatest(l, g0 + bin * w), 0) / (r - l)
+                        ELSE n END) AS n,
+               any_value(g0) AS lo,
+               any_value(g0 + w * ?) AS hi
+        FROM spans
+        GROUP BY step, bin
+        ORDER BY step, bin
+    """, [study, tag, bins, bins, bins, bins]).fetchnumpy()
+    if len(result['step']) == 0:
+        return None
+    steps, columns = np.unique(np.asarray(result['step'], dtype=np.int64), return_inverse=True)
+    density = np.zeros((bins, len(steps)))
+    density[np.asarray(result['bin']), columns] = as_float_array(result['n'])
+    totals = density.sum(axis=0)
+    density /= np.where(totals > 0, totals, 1)
+    lo, hi = float(result['lo'][0]), float(result['hi'][0])
+    return {
+        'step': steps,
+        'edges': np.linspace(lo, hi if hi > lo else lo + 1, bins + 1),
+        'density': density,
+    }
+
+
+class BrainStatsRepository:
+    """Read-only access to brain stats data.
+
+    Wraps the fetch_* functions above around a connection that is opened
+    on first use and can be released between uses, so a running importer
+    can take the write lock. A connection must not be shared between
+    threads; give each thread its own repository.
+
+    sources is one path or a list of them: DuckDB files, Parquet datasets
+    or folders holding either. A single DuckDB file is opened directly,
+    anything else is attached to an in-memory database, see attach_sources.
+    """
+
+    def __init__(self, sources=DB_PATH, config=None):
+        self.sources = [sources] if isinstance(sources, str) else list(sources)
+        self.config = config or {}
+        self._con = None
+        self._has_series_stats = None
+        self._has_histograms = None
+
+    @property
+    def con(self):
+        if self._con is None:
+            import duckdb
+            # Expanded on every connect, so files copied in since are picked up
+            sources = expand_sources(self.sources)
+            if len(sources) == 1 and not os.path.isdir(sources[0]):
+                self._con = duckdb.connect(sources[0], read_only=True, config=self.config)
+            else:
+                self._con = duckdb.connect(config=self.config)
+                # has_table would also see the attached files' own tables, go by the views
+                views = attach_sources(self._con, sources)
+                self._has_series_stats = 'series_stats' in views
+                self._has_histograms = 'histograms' in views
+        return self._con
+
+    @property
+    def is_open(self):
+        return self._con is not None
+
+    def release(self):
+        """Close the connection, the next query opens a fresh one that sees newer commits"""
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+        self._has_series_stats = None
+        self._has_histograms = None
+
+    close = release
+
+    @property
+    def has_series_stats(self):
+        # Databases written before the importer kept summaries have no series_stats
+        con = self.con
+        if self._has_series_stats is None:
+            self._has_series_stats = has_table(con, 'series_stats')
+        return self._has_series_stats
+
+    @property
+    def has_histograms(self):
+        # Neither is there a histograms table in databases from before it was imported
+        con = self.con
+        if self._has_histograms is None:
+            self._has_histograms = has_table(con, 'histograms')
+        return self._has_histograms
+
+    def watermark(self):
+        return tuple(source_watermark(source) for source in self.sources)
+
+    # Catalog
+
+    def catalog(self):
+        """Sorted machines, sorted studies and the (machine, study) pairs"""
+        # series_stats is far smaller than scalars and has the same studies
+        return fetch_catalog(self.con, 'series_stats' if self.has_series_stats else 'scalars')
+
+    def tags(self, study, kind='scalar'):
+        if kind == 'histogram' and not self.has_histograms:
+            return []
+        return fetch_tags(self.con, study, kind)
+
+    def all_scalar_tags(self):
+        return fetch_column(self.con, "SELECT DISTINCT tag FROM scalars ORDER BY tag")
+
+    # Scalar series
+
+    def series(self, study, tag):
+        return fetch_series(self.con, study, tag)
+
+    def series_batch(self, keys, after_steps=None, by_machine=False, source=None):
+        return fetch_series_batch(self.con, keys, after_steps, by_machine, source)
+
+    def machine_bands(self, keys, grid_points=BAND_GRID_POINTS, source=None):
+        return fetch_machine_bands(self.con, keys, grid_points, source)
+
+    def plot_data(self, study, tags, machine_mode, metric=METRIC_VALUE, x_axis=X_STEP, smoothing=1, eta_target=None):
+        return fetch_plot_data(self.con, study, tags, machine_mode, metric, x_axis, smoothing, eta_target)
+
+    def series_stats(self, keys):
+        if not self.has_series_stats:
+            return []
+        return fetch_series_stats(self.con, keys)
+
+    def leaderboard(self, tag, reducer, last_n=10, ascending=False, limit=LEADERBOARD_PAGE_SIZE, offset=0):
+        return fetch_leaderboard(self.con, tag, reducer, last_n=last_n, ascending=ascending, limit=limit,
+                                 offset=offset, use_stats=self.has_series_stats)
+
+    def fingerprint(self, study, tag, style):
+        return plot_fingerprint(self.con, study, tag, style, self.has_series_stats)
+
+    def histogram_grid(self, study, tag, bins=HISTOGRAM_BINS):
+        return fetch_histogram_grid(self.con, study, tag, bins)
+
+    # Images
+
+    def image_steps(self, study, tag):
+        return fetch_image_steps(self.con, study, tag)
+
+    def image_metadata(self, study, tag):
+        return fetch_image_metadata(self.con, study, tag)
+
+    def image_payload(self, study, tag, steps):
+        return fetch_image_payload(self.con, study, tag, steps)
+
+    def images(self, study, tag):
+        return fetch_images(self.con, study, tag)